@@ -0,0 +1,312 @@
+"""Model requests behind the chat: the initial analysis and follow-ups.
+
+Kept free of Streamlit so the app, ``batch_analysis`` and ``benchmark`` share
+one request path. The OpenAI SDK reads ``OPENAI_API_KEY`` (and
+``OPENAI_BASE_URL``) from the environment; under ``streamlit run`` root-level
+secrets are exported there as well.
+"""
+
+import logging
+import uuid
+
+from openai import BadRequestError, NotFoundError
+
+from conversation import (
+    chained_follow_up_input,
+    compaction_input,
+    initial_input,
+    needs_compaction,
+    new_conversation_state,
+    prompt_cache_key,
+    replayed_follow_up_input,
+    unsent_documents,
+)
+from openai_client import create_response, create_response_stream
+from prompt_builder import DEFAULT_INSTITUTION_ID, assemble_analysis_prompt
+from request_scheduler import REQUEST_SCHEDULER, SlotReservation
+from response_cache import (
+    RESPONSE_CACHE_ENABLED,
+    get_cached_response,
+    replay_stream,
+    response_cache_key,
+    store_response,
+)
+from telemetry import annotate, span, start_request
+
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-5-mini"
+REASONING = {"effort": "medium"}
+
+
+def _analysis_prompt(
+    messages,
+    include_pdf,
+    include_helsinki,
+    include_tartu,
+    uploaded_documents,
+    institution_id,
+):
+    """Build the initial analysis prompt and its provider prompt-cache key."""
+    with span("prompt_build"):
+        full_prompt, report = assemble_analysis_prompt(
+            messages[0]["content"],
+            include_pdf,
+            include_helsinki,
+            include_tartu,
+            uploaded_documents,
+            institution_id,
+        )
+    logger.debug("Full prompt length: %d characters", len(full_prompt))
+    annotate(prompt_chars=len(full_prompt), prompt_tokens=report["total_tokens"])
+    cache_key = prompt_cache_key(full_prompt[: report["static_prefix_chars"]])
+    return full_prompt, cache_key
+
+
+def _create_stream(prompt_input, cache_key, previous_response_id=None):
+    request = {
+        "model": MODEL,
+        "input": prompt_input,
+        "reasoning": REASONING,
+    }
+    if cache_key:
+        # Sent as a raw field so it also works with SDKs that predate the argument.
+        request["extra_body"] = {"prompt_cache_key": cache_key}
+    if previous_response_id:
+        request["previous_response_id"] = previous_response_id
+    # The call returns once the first text delta has arrived.
+    with span("model_first_token"):
+        return create_response_stream(**request)
+
+
+def _compact_conversation(conversation_state, messages):
+    """Fold turns outside the verbatim window into the cached summary."""
+    summary_input, summary_upto = compaction_input(conversation_state, messages)
+    folded = summary_upto - conversation_state["summary_upto"]
+    with span("compaction", messages=folded):
+        response = create_response(
+            model=MODEL,
+            input=summary_input,
+            reasoning={"effort": "low"},
+        )
+    conversation_state["summary"] = response.output_text.strip()
+    conversation_state["summary_upto"] = summary_upto
+    logger.info(
+        "Compacted %d messages into a %d-character summary; "
+        "verbatim history now starts at message %d",
+        folded,
+        len(conversation_state["summary"]),
+        summary_upto,
+    )
+
+
+def _is_expired_response_error(exc):
+    return isinstance(exc, NotFoundError) or (
+        isinstance(exc, BadRequestError)
+        and "previous_response" in str(getattr(exc, "code", "") or exc)
+    )
+
+
+def _ignore_status(message):
+    pass
+
+
+def stream_openai_response(
+    messages,
+    include_pdf,
+    include_helsinki,
+    include_tartu,
+    uploaded_documents=None,
+    institution_id=DEFAULT_INSTITUTION_ID,
+    conversation_state=None,
+    set_status=None,
+    session_id=None,
+):
+    """Generate and stream response from OpenAI API.
+
+    Follow-ups chain onto the previous stored response via
+    ``conversation_state`` and send only the new question and newly uploaded
+    documents; if that response has expired the conversation is replayed.
+    With ``RESPONSE_CACHE=1`` a previously completed initial analysis with
+    the same prompt is replayed from disk instead of calling the API.
+    Progress messages go to ``set_status``, if given.
+
+    API calls wait for a slot of the process-wide ``REQUEST_SCHEDULER``,
+    shared fairly between sessions by ``session_id``; the queue position is
+    shown through ``set_status`` while waiting.
+
+    With ``TELEMETRY=1`` the request's stage timings, prompt size, time to
+    first token and streaming rate are recorded (see ``telemetry``).
+    """
+    if set_status is None:
+        set_status = _ignore_status
+
+    slot = SlotReservation(
+        REQUEST_SCHEDULER,
+        session_id or uuid.uuid4().hex,
+        lambda position: set_status(f"U redu čekanja: {position}. mjesto..."),
+    )
+    trace = start_request(
+        "analysis" if len(messages) == 1 else "follow_up",
+        model=MODEL,
+        messages=len(messages),
+        uploaded_documents=len(uploaded_documents or []),
+    )
+    error = None
+    try:
+        for chunk in _response_chunks(
+            messages,
+            include_pdf,
+            include_helsinki,
+            include_tartu,
+            uploaded_documents,
+            institution_id,
+            conversation_state,
+            set_status,
+            slot.acquire,
+        ):
+            trace.record_output(chunk)
+            yield chunk
+    except Exception as exc:
+        error = exc
+        raise
+    finally:
+        slot.release()
+        trace.finish(error)
+
+
+def _response_chunks(
+    messages,
+    include_pdf,
+    include_helsinki,
+    include_tartu,
+    uploaded_documents,
+    institution_id,
+    conversation_state,
+    set_status,
+    wait_for_slot,
+):
+    logger.debug("Starting chat response generation. Messages count: %d", len(messages))
+    if conversation_state is None:
+        conversation_state = new_conversation_state()
+
+    uploaded_documents = uploaded_documents or []
+    response_key = None
+
+    if len(messages) == 1:
+        logger.debug("First message - building full analysis prompt")
+
+        if include_pdf or include_helsinki or include_tartu:
+            set_status("Čitam dokumente...")
+
+        conversation_state.update(new_conversation_state())
+        full_prompt, cache_key = _analysis_prompt(
+            messages,
+            include_pdf,
+            include_helsinki,
+            include_tartu,
+            uploaded_documents,
+            institution_id,
+        )
+        conversation_state["cache_key"] = cache_key
+        sent_documents = {filename for filename, _ in uploaded_documents}
+        prompt_input = initial_input(full_prompt)
+
+        if RESPONSE_CACHE_ENABLED:
+            response_key = response_cache_key(prompt_input, MODEL, REASONING)
+            with span("response_cache_lookup") as stage:
+                cached = get_cached_response(response_key)
+                stage.set(hit=cached is not None)
+            if cached is not None:
+                annotate(response_cache_hit=True)
+                # Follow-ups can still chain onto the stored response; if it
+                # has expired upstream they fall back to replaying history.
+                conversation_state["previous_response_id"] = cached["response_id"]
+                conversation_state["sent_documents"] |= sent_documents
+                set_status(None)
+                yield from replay_stream(cached["text"])
+                return
+
+        wait_for_slot()
+        set_status("Razmišljam...")
+        stream = _create_stream(prompt_input, cache_key)
+    else:
+        new_documents = unsent_documents(conversation_state, uploaded_documents)
+        previous_response_id = conversation_state["previous_response_id"]
+        stream = None
+        wait_for_slot()
+        if needs_compaction(conversation_state, messages):
+            set_status("Sažimam raniji razgovor...")
+            _compact_conversation(conversation_state, messages)
+            # Start a fresh chain from the compacted history.
+            previous_response_id = None
+        if previous_response_id:
+            logger.info(
+                "Follow-up message - chaining onto response %s", previous_response_id
+            )
+            set_status("Razmišljam...")
+            try:
+                stream = _create_stream(
+                    chained_follow_up_input(messages[-1]["content"], new_documents),
+                    conversation_state.get("cache_key"),
+                    previous_response_id,
+                )
+            except (NotFoundError, BadRequestError) as exc:
+                if not _is_expired_response_error(exc):
+                    raise
+                logger.warning(
+                    "Previous response unavailable, replaying conversation: %s", exc
+                )
+
+        if stream is None:
+            logger.info(
+                "Follow-up message - replaying history behind the analysis prompt"
+            )
+            set_status("Čitam dokumente...")
+            full_prompt, cache_key = _analysis_prompt(
+                messages,
+                include_pdf,
+                include_helsinki,
+                include_tartu,
+                uploaded_documents,
+                institution_id,
+            )
+            conversation_state["cache_key"] = cache_key
+            set_status("Razmišljam...")
+            stream = _create_stream(
+                replayed_follow_up_input(
+                    full_prompt, messages, uploaded_documents, conversation_state
+                ),
+                cache_key,
+            )
+        sent_documents = {filename for filename, _ in uploaded_documents}
+
+    logger.debug("Using model: %s", MODEL)
+    logger.debug("OpenAI stream created successfully")
+
+    content_started = False
+    response_parts = []
+
+    for chunk in stream:
+        if getattr(chunk, "type", None) == "response.completed":
+            conversation_state["previous_response_id"] = chunk.response.id
+            conversation_state["sent_documents"] |= sent_documents
+            logger.debug("Stored response %s for follow-ups", chunk.response.id)
+            if response_key and response_parts:
+                store_response(response_key, "".join(response_parts), chunk.response.id)
+        elif hasattr(chunk, "delta") and chunk.delta:
+            if not content_started:
+                set_status(None)
+                content_started = True
+                logger.debug("Cleared status indicator, starting content stream")
+
+            response_parts.append(chunk.delta)
+            yield chunk.delta
+        elif hasattr(chunk, "content") and chunk.content:
+            if not content_started:
+                set_status(None)
+                content_started = True
+                logger.debug("Cleared status indicator, starting content stream")
+
+            response_parts.append(chunk.content)
+            yield chunk.content
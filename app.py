@@ -1,109 +1,128 @@
+import logging
+import os
+import uuid
 from pathlib import Path
 
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
 from streamlit_pdf_viewer import pdf_viewer
 
-from prompt_builder import build_analysis_prompt
-from survey_ui import display_survey_data
-from utils import extract_text_from_pdf, generate_conversation_pdf
+from analysis import stream_openai_response
+from conversation import new_conversation_state
+from document_store import DOCUMENT_STORE
+from generation_jobs import cancel_job, finish_job, follow_job, start_job
+from request_scheduler import REQUEST_SCHEDULER
+from survey_ui import display_survey_data, select_institution
+from telemetry import configure_logging
+from upload_processing import SessionUploads, get_extraction, resolve_documents
+from utils import conversation_hash, generate_conversation_pdf
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
+configure_logging()
 
 API_KEY = st.secrets.get("OPENAI_API_KEY")
-MODEL = "gpt-5-mini"
+# Optional cap on pages read from each uploaded PDF (unset reads the whole file).
+UPLOAD_MAX_PAGES = (
+    int(os.environ["PDF_UPLOAD_MAX_PAGES"])
+    if os.environ.get("PDF_UPLOAD_MAX_PAGES")
+    else None
+)
+STRATEGY_PDF_PATH = Path("assets") / "strategija_razvoja.pdf"
+LOGO_PATH = Path("assets") / "carnet.jpg"
+# Shows document store and request queue counters in the sidebar.
+SHOW_RUNTIME_STATS = os.environ.get("SHOW_RUNTIME_STATS", "0") == "1"
 
 if not API_KEY:
     st.error("API key not found.")
     st.stop()
 
 
-def stream_openai_response(
-    messages,
-    include_pdf,
-    include_helsinki,
-    include_tartu,
-    uploaded_documents=None,
-):
-    """Generate and stream response from OpenAI API."""
-    print(f"Starting chat response generation. Messages count: {len(messages)}")
-    client = OpenAI()
-
-    status_placeholder = st.empty()
-
-    if len(messages) == 1:
-        print("First message - building full analysis prompt")
-
-        if include_pdf or include_helsinki or include_tartu:
-            status_placeholder.markdown("*Čitam dokumente...*")
-
-        user_context = messages[0]["content"]
-        full_prompt = build_analysis_prompt(
-            user_context,
-            include_pdf,
-            include_helsinki,
-            include_tartu,
-            uploaded_documents,
-        )
-        print(f"Full prompt length: {len(full_prompt)} characters")
-        prompt_input = full_prompt
-    else:
-        print("Follow-up message - using chat history")
-        conversation = "Prethodni razgovor:\n"
-        for msg in messages:
-            conversation += f"{msg['role']}: {msg['content']}\n\n"
-
-        conversation += """Upute za odgovor:
-- Odgovorite na korisnikovo najnovije pitanje ili komentar
-- Ako korisnik daje nove informacije, kontekst ili uvide koji bi mogli utjecati na analizu, ponudite mu izradu nove/ažurirane analize i preporuka
-- Pitajte korisnika: "Želite li da napravim novu analizu i preporuke na temelju ovih novih informacija?"
-- Koristite Markdown formatiranje za bolju čitljivost"""
-
-        if uploaded_documents:
-            conversation += "\n\nDostupni korisnički PDF dokumenti za kontekst:\n"
-            for filename, text in uploaded_documents:
-                trimmed_text = text.strip()
-                if not trimmed_text:
-                    print(f"Skipping empty user document in follow-up: {filename}")
-                    continue
-                print(
-                    "Adding user document to follow-up conversation: "
-                    f"{filename} with {len(trimmed_text)} characters"
-                )
-                conversation += f"[USER PDF] {filename}:\n{trimmed_text}\n\n"
-
-        prompt_input = conversation
-
-    print(f"Using model: {MODEL}")
-    status_placeholder.markdown("*Razmišljam...*")
+@st.cache_resource(show_spinner=False)
+def _asset_bytes(path, mtime_ns):
+    """Read a static asset once per process (and again only if it changes)."""
+    return path.read_bytes()
 
-    stream = client.responses.create(
-        model=MODEL,
-        input=prompt_input,
-        reasoning={"effort": "medium"},
-        stream=True,
-    )
 
-    print("OpenAI stream created successfully")
+def _status_writer(placeholder):
+    """Return a callback showing a progress message in ``placeholder``."""
 
-    content_started = False
+    def set_status(message):
+        if message:
+            placeholder.markdown(f"*{message}*")
+        else:
+            placeholder.empty()
 
-    for chunk in stream:
-        if hasattr(chunk, "delta") and chunk.delta:
-            if not content_started:
-                status_placeholder.empty()
-                content_started = True
-                print("Cleared status indicator, starting content stream")
+    return set_status
 
-            yield chunk.delta
-        elif hasattr(chunk, "content") and chunk.content:
-            if not content_started:
-                status_placeholder.empty()
-                content_started = True
-                print("Cleared status indicator, starting content stream")
 
-            yield chunk.content
+def _upload_status(uploads):
+    """Show extraction progress, problems and the documents ready for analysis."""
+    ready = []
+    pending = False
+    lost = False
+    seen = set()
+    for filename, content_hash in uploads:
+        extraction = get_extraction(content_hash)
+        if content_hash in seen:
+            st.info(
+                f"Dokument {filename} istog je sadržaja kao već učitani dokument."
+            )
+            continue
+        seen.add(content_hash)
+        # A dropped extraction is restarted by the next full run of the app.
+        lost |= extraction is None
+        if extraction is None or not extraction.done():
+            pending = True
+            pages = (
+                f" ({extraction.pages_done}/{extraction.pages_total} stranica)"
+                if extraction is not None and extraction.pages_total
+                else ""
+            )
+            fraction = extraction.fraction if extraction is not None else 0.0
+            st.progress(fraction, text=f"Čitam {filename}{pages}...")
+            continue
+        try:
+            text = extraction.text()
+        except Exception as exc:
+            st.warning(f"Ne mogu pročitati {filename}: {exc}")
+            continue
+        if text.strip():
+            ready.append(filename)
+        else:
+            st.warning(f"Dokument {filename} ne sadrži čitljiv tekst.")
+
+    if ready:
+        st.success(
+            "Korisnički PDF dokumenti će biti uključeni u analizu: "
+            + ", ".join(ready)
+        )
+    if lost and not st.session_state.get("upload_status_full_run"):
+        st.rerun()
+    if (
+        not pending
+        and st.session_state.get("upload_status_polling")
+        and not st.session_state.get("upload_status_full_run")
+    ):
+        # Extraction finished during fragment reruns; rerun the app to stop
+        # polling. A full run re-registers the fragment without polling anyway,
+        # and rerunning there would drop a chat message sent in the same run.
+        st.session_state.upload_status_polling = False
+        st.rerun()
+    st.session_state.upload_status_polling = pending
+
+
+def _runtime_stats():
+    store = DOCUMENT_STORE.stats()
+    with st.sidebar:
+        st.markdown("#### Stanje poslužitelja")
+        st.metric(
+            "Tekst dokumenata u memoriji",
+            f"{store['resident_bytes'] / 1024 / 1024:.1f} MB",
+            help=f"Ograničenje: {store['max_resident_bytes'] / 1024 / 1024:.0f} MB",
+        )
+        st.json({"dokumenti": store, "zahtjevi": REQUEST_SCHEDULER.stats()})
 
 
 def main():
@@ -111,25 +130,40 @@ def main():
         st.session_state.messages = []
     if "analysis_complete" not in st.session_state:
         st.session_state.analysis_complete = False
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
     if "uploaded_documents" not in st.session_state:
-        st.session_state.uploaded_documents = {}
+        st.session_state.uploaded_documents = SessionUploads(
+            st.session_state.session_id
+        )
+    if "conversation_state" not in st.session_state:
+        st.session_state.conversation_state = new_conversation_state()
+    if "generation_job" not in st.session_state:
+        st.session_state.generation_job = None
 
-    st.image("assets/carnet.jpg", width=300)
+    if SHOW_RUNTIME_STATS:
+        _runtime_stats()
+
+    st.image(_asset_bytes(LOGO_PATH, LOGO_PATH.stat().st_mtime_ns), width=300)
     st.markdown(
         "<h3>Savjetnik za digitalnu transformaciju VU u RH</h3>", unsafe_allow_html=True
     )
 
-    pdf_path = Path("assets") / "strategija_razvoja.pdf"
-    pdf_viewer(
-        str(pdf_path),
-        width=700,
-        height=600,
-        zoom_level="auto",
-        viewer_align="center",
-        show_page_separator=True,
-    )
+    with st.expander("📄 Strategija razvoja UNIPU"):
+        # Expander bodies run on every rerun; the toggle keeps the 1.2 MB
+        # document out of reruns until someone actually wants to read it.
+        if st.toggle("Prikaži dokument", key="show_strategy_pdf"):
+            pdf_viewer(
+                _asset_bytes(STRATEGY_PDF_PATH, STRATEGY_PDF_PATH.stat().st_mtime_ns),
+                width=700,
+                height=600,
+                zoom_level="auto",
+                viewer_align="center",
+                show_page_separator=True,
+            )
 
-    display_survey_data()
+    institution_id = select_institution()
+    display_survey_data(institution_id)
 
     include_pdf = st.toggle(
         "Uključi UNIPU strategiju razvoja u analizu",
@@ -152,8 +186,7 @@ def main():
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
 
-    # Handle file uploads first
-    upload_errors: list[str] = []
+    # Start extracting new uploads in the background; the page keeps rendering.
     uploaded_files = st.session_state.get("user_pdf_uploader")
     current_uploaded_names: set[str] = set()
 
@@ -161,34 +194,26 @@ def main():
         for uploaded_file in uploaded_files:
             current_uploaded_names.add(uploaded_file.name)
 
-            if uploaded_file.name in st.session_state.uploaded_documents:
-                continue
-
-            try:
-                text = extract_text_from_pdf(uploaded_file)
-            except Exception as exc:  # pragma: no cover - streamlit runtime feedback
-                error_message = f"Ne mogu pročitati {uploaded_file.name}: {exc}"
-                upload_errors.append(error_message)
-                print(error_message)
+            if not st.session_state.uploaded_documents.needs_extraction(
+                uploaded_file.name
+            ):
                 continue
+            # An upload whose extraction was dropped is extracted again.
+            if uploaded_file.name in st.session_state.uploaded_documents:
+                st.session_state.uploaded_documents.remove(uploaded_file.name)
 
-            if text and text.strip():
-                st.session_state.uploaded_documents[uploaded_file.name] = text
-            else:
-                warning_message = (
-                    f"Dokument {uploaded_file.name} ne sadrži čitljiv tekst."
-                )
-                upload_errors.append(warning_message)
-                print(warning_message)
+            st.session_state.uploaded_documents.add(
+                uploaded_file.name, uploaded_file.getvalue(), UPLOAD_MAX_PAGES
+            )
 
         removed_documents = [
             name
-            for name in list(st.session_state.uploaded_documents.keys())
+            for name in st.session_state.uploaded_documents
             if name not in current_uploaded_names
         ]
 
         for name in removed_documents:
-            del st.session_state.uploaded_documents[name]
+            st.session_state.uploaded_documents.remove(name)
 
     user_uploaded_documents = list(st.session_state.uploaded_documents.items())
 
@@ -206,14 +231,19 @@ def main():
     chat_controls = st.container()
     with chat_controls:
         if user_uploaded_documents:
-            st.success(
-                "Korisnički PDF dokumenti će biti uključeni u analizu: "
-                + ", ".join(doc[0] for doc in user_uploaded_documents)
+            pending = any(
+                extraction is None or not extraction.done()
+                for extraction in (
+                    get_extraction(content_hash)
+                    for _, content_hash in user_uploaded_documents
+                )
             )
-
-        if upload_errors:
-            for message in upload_errors:
-                st.warning(message)
+            # Poll while extraction runs so progress updates without a rerun.
+            st.session_state.upload_status_full_run = True
+            st.fragment(_upload_status, run_every=1.0 if pending else None)(
+                user_uploaded_documents
+            )
+            st.session_state.upload_status_full_run = False
 
         upload_col, input_col = st.columns([1, 5], vertical_alignment="bottom")
         with upload_col:
@@ -230,7 +260,13 @@ def main():
                     label_visibility="collapsed",
                 )
         with input_col:
-            prompt = st.chat_input(placeholder, key="chat_prompt")
+            # A response from an earlier run is still being generated.
+            generating = st.session_state.generation_job is not None
+            prompt = st.chat_input(placeholder, key="chat_prompt", disabled=generating)
+
+    if prompt and st.session_state.generation_job is not None:
+        st.toast("Pričekajte da se dovrši trenutni odgovor.")
+        prompt = None
 
     if prompt:
         st.session_state.messages.append({"role": "user", "content": prompt})
@@ -239,34 +275,56 @@ def main():
             with chat_container.chat_message("user"):
                 st.markdown(prompt)
 
+        # The response is generated in a background job so that reruns
+        # triggered by other widgets re-attach to it instead of restarting.
+        messages = list(st.session_state.messages)
+        uploads = list(user_uploaded_documents)
+        conversation_state = st.session_state.conversation_state
+        session_id = st.session_state.session_id
+        logger.debug("Starting generation job...")
+        st.session_state.generation_job = start_job(
+            lambda set_status: stream_openai_response(
+                messages,
+                include_pdf,
+                include_helsinki,
+                include_tartu,
+                resolve_documents(uploads, set_status),
+                institution_id,
+                conversation_state,
+                set_status,
+                session_id,
+            )
+        )
+
+    job_id = st.session_state.generation_job
+    if job_id is not None:
         with chat_container.chat_message("assistant"):
             try:
-                print("Getting OpenAI stream...")
                 response = st.write_stream(
-                    stream_openai_response(
-                        st.session_state.messages,
-                        include_pdf,
-                        include_helsinki,
-                        include_tartu,
-                        user_uploaded_documents,
-                    )
+                    follow_job(job_id, _status_writer(st.empty()))
                 )
-                print("Stream completed.")
+                logger.debug("Stream completed.")
 
                 if not response:
                     response = "Dogodila se greška pri generiranju odgovora."
-                    print("No response generated, using fallback")
+                    logger.warning("No response generated, using fallback")
 
             except Exception as exc:
-                print(f"Error during streaming: {str(exc)}")
+                logger.error("Error during streaming: %s", exc)
                 response = f"Greška pri generiranju odgovora: {str(exc)}"
                 st.error(response)
 
+        finish_job(job_id)
+        st.session_state.generation_job = None
         st.session_state.messages.append({"role": "assistant", "content": response})
 
         if not st.session_state.analysis_complete:
             st.session_state.analysis_complete = True
 
+        if generating:
+            # Re-enable the chat input that was rendered disabled.
+            st.rerun()
+
     if st.session_state.messages:
         st.markdown("---")
 
@@ -275,15 +333,33 @@ def main():
 
         with col1:
             if st.button("Počni novi razgovor"):
+                cancel_job(st.session_state.generation_job)
+                st.session_state.generation_job = None
                 st.session_state.messages = []
                 st.session_state.analysis_complete = False
+                st.session_state.conversation_state = new_conversation_state()
                 st.rerun()
 
         with col2:
-            try:
-                # Generate PDF from conversation
-                pdf_bytes = generate_conversation_pdf(st.session_state.messages)
-
+            # The PDF is built only on request and kept until the messages change.
+            messages_hash = conversation_hash(st.session_state.messages)
+            cached_pdf = st.session_state.get("conversation_pdf")
+            if cached_pdf is None or cached_pdf[0] != messages_hash:
+                cached_pdf = None
+                button_slot = st.empty()
+                if button_slot.button(
+                    "📄 Pripremi PDF",
+                    help="Izradi PDF dokument s kompletnim razgovorom",
+                ):
+                    button_slot.empty()
+                    try:
+                        pdf_bytes = generate_conversation_pdf(st.session_state.messages)
+                        cached_pdf = (messages_hash, pdf_bytes)
+                        st.session_state.conversation_pdf = cached_pdf
+                    except Exception as e:
+                        st.error(f"Greška pri generiranju PDF-a: {str(e)}")
+
+            if cached_pdf is not None:
                 # Create filename with timestamp
                 from datetime import datetime
 
@@ -292,13 +368,11 @@ def main():
 
                 st.download_button(
                     label="📄 Preuzmi PDF",
-                    data=pdf_bytes,
+                    data=cached_pdf[1],
                     file_name=filename,
                     mime="application/pdf",
                     help="Preuzmi kompletan razgovor kao PDF dokument",
                 )
-            except Exception as e:
-                st.error(f"Greška pri generiranju PDF-a: {str(e)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,332 @@
+"""Headless batch analysis for many institutions and prompt configurations.
+
+Runs the initial analysis for every combination of the given institutions,
+document toggles and user contexts, without the Streamlit UI. Jobs run
+concurrently (``--concurrency``, at most ``MAX_CONCURRENT_REQUESTS`` reach
+the model at once) through the same path as the chat, so retries, the
+response cache and telemetry apply. Each finished job writes a markdown and
+a PDF report plus a small JSON record to ``--output-dir``::
+
+    uv run python batch_analysis.py --institutions all --helsinki on off
+    uv run python batch_analysis.py --institutions 20 35 \\
+        --context "Pokreni analizu." --context "Naglasak na umjetnoj inteligenciji."
+
+A job's name is derived from its parameters, including the content hash of
+every uploaded PDF, and jobs whose record says ``done`` are skipped, so an
+interrupted batch continues where it stopped when run again with the same
+arguments. ``--dry-run`` only writes the
+prompts built by ``build_analysis_prompt``.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from itertools import product
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+from analysis import MODEL, stream_openai_response
+from institution_index import list_institutions
+from pdf_cache import content_hash, extract_text_cached
+from prompt_builder import DEFAULT_INSTITUTION_ID, build_analysis_prompt
+from request_scheduler import MAX_CONCURRENT_REQUESTS
+from telemetry import configure_logging
+from utils import convert_conversation_to_markdown, generate_conversation_pdf
+
+OUTPUT_DIR = Path("batch_reports")
+DEFAULT_CONTEXT = "Pokreni analizu."
+TOGGLE_VALUES = {"on": True, "off": False}
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    institution_id: int
+    include_pdf: bool
+    include_helsinki: bool
+    include_tartu: bool
+    context: str
+    # (file name, SHA-256 of the PDF), so a changed file is a different job.
+    uploads: Tuple[Tuple[str, str], ...] = ()
+
+    @property
+    def name(self) -> str:
+        """Readable, stable file name stem for the job's reports."""
+        documents = [
+            label
+            for label, included in (
+                ("strategija", self.include_pdf),
+                ("helsinki", self.include_helsinki),
+                ("tartu", self.include_tartu),
+            )
+            if included
+        ]
+        digest = hashlib.sha256(
+            json.dumps(asdict(self), sort_keys=True).encode("utf-8")
+        ).hexdigest()[:8]
+        documents_label = "+".join(documents) or "bez-dokumenata"
+        return f"vu{self.institution_id}_{documents_label}_{digest}"
+
+
+def build_jobs(
+    institution_ids: List[int],
+    include_pdf: List[bool],
+    include_helsinki: List[bool],
+    include_tartu: List[bool],
+    contexts: List[str],
+    uploads: Tuple[Tuple[str, str], ...] = (),
+) -> List[BatchJob]:
+    """Return every combination of the parameters, without duplicates."""
+    jobs = [
+        BatchJob(*combination, uploads)
+        for combination in product(
+            institution_ids, include_pdf, include_helsinki, include_tartu, contexts
+        )
+    ]
+    return list(dict.fromkeys(jobs))
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=path.name, suffix=".tmp", delete=False
+    ) as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp_file.name, path)
+
+
+def _record_path(output_dir: Path, job: BatchJob) -> Path:
+    return output_dir / f"{job.name}.json"
+
+
+def is_done(output_dir: Path, job: BatchJob) -> bool:
+    """Whether an earlier run already wrote this job's reports."""
+    try:
+        record = json.loads(_record_path(output_dir, job).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return False
+    return record.get("status") == "done" and all(
+        (output_dir / record["reports"][kind]).exists() for kind in ("markdown", "pdf")
+    )
+
+
+def _write_record(output_dir: Path, job: BatchJob, **fields) -> Dict:
+    record = {"job": asdict(job), **fields}
+    _atomic_write(
+        _record_path(output_dir, job),
+        (json.dumps(record, indent=2, ensure_ascii=False) + "\n").encode("utf-8"),
+    )
+    return record
+
+
+def run_job(
+    job: BatchJob,
+    output_dir: Path,
+    uploaded_documents: List[Tuple[str, str]],
+    stop: threading.Event,
+) -> Dict:
+    """Generate one analysis and write its reports (runs in a worker thread)."""
+    started = time.perf_counter()
+    messages = [{"role": "user", "content": job.context}]
+    parts = []
+    # Closing the generator early releases the job's request slot.
+    stream = stream_openai_response(
+        messages,
+        job.include_pdf,
+        job.include_helsinki,
+        job.include_tartu,
+        uploaded_documents,
+        job.institution_id,
+        session_id=f"batch-{job.name}",
+    )
+    try:
+        for chunk in stream:
+            if stop.is_set():
+                raise RuntimeError("Batch interrupted")
+            parts.append(chunk)
+    finally:
+        stream.close()
+
+    response = "".join(parts)
+    if not response:
+        raise RuntimeError("The model returned an empty response")
+    messages.append({"role": "assistant", "content": response})
+
+    markdown_path = output_dir / f"{job.name}.md"
+    pdf_path = output_dir / f"{job.name}.pdf"
+    _atomic_write(
+        markdown_path, convert_conversation_to_markdown(messages).encode("utf-8")
+    )
+    _atomic_write(pdf_path, generate_conversation_pdf(messages))
+    return _write_record(
+        output_dir,
+        job,
+        status="done",
+        model=MODEL,
+        seconds=round(time.perf_counter() - started, 3),
+        response_chars=len(response),
+        reports={"markdown": markdown_path.name, "pdf": pdf_path.name},
+    )
+
+
+def write_prompt(
+    job: BatchJob, output_dir: Path, uploaded_documents: List[Tuple[str, str]]
+) -> None:
+    prompt = build_analysis_prompt(
+        job.context,
+        job.include_pdf,
+        job.include_helsinki,
+        job.include_tartu,
+        uploaded_documents,
+        job.institution_id,
+    )
+    _atomic_write(output_dir / f"{job.name}.prompt.txt", prompt.encode("utf-8"))
+
+
+async def run_batch(
+    jobs: List[BatchJob],
+    output_dir: Path,
+    uploaded_documents: List[Tuple[str, str]],
+    concurrency: int,
+) -> Dict[str, int]:
+    """Run ``jobs`` with at most ``concurrency`` in flight; return status counts."""
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(concurrency)
+    stop = threading.Event()
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+
+    async def run(number: int, job: BatchJob) -> None:
+        label = f"[{number}/{len(jobs)}] {job.name}"
+        if is_done(output_dir, job):
+            print(f"{label}: already done, skipping")
+            counts["skipped"] += 1
+            return
+        async with limit:
+            print(f"{label}: started")
+            try:
+                record = await loop.run_in_executor(
+                    executor, run_job, job, output_dir, uploaded_documents, stop
+                )
+            except Exception as exc:
+                print(f"{label}: failed: {exc}")
+                error = f"{type(exc).__name__}: {exc}"
+                _write_record(output_dir, job, status="failed", error=error)
+                counts["failed"] += 1
+                return
+        print(
+            f"{label}: done in {record['seconds']:.1f}s "
+            f"({record['response_chars']} characters)"
+        )
+        counts["done"] += 1
+
+    try:
+        await asyncio.gather(*(run(number, job) for number, job in enumerate(jobs, 1)))
+    finally:
+        # On interruption, running jobs stop at their next chunk and are redone
+        # by the next run; queued ones never start.
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+    return counts
+
+
+def _toggle(values: List[str]) -> List[bool]:
+    return [TOGGLE_VALUES[value] for value in values]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--institutions",
+        nargs="+",
+        default=[str(DEFAULT_INSTITUTION_ID)],
+        help='institution IDs (VU_ID) or "all" for every one in the survey data',
+    )
+    toggle = {"nargs": "+", "choices": sorted(TOGGLE_VALUES)}
+    parser.add_argument(
+        "--strategy", default=["on"], help="include the UNIPU strategy", **toggle
+    )
+    parser.add_argument(
+        "--helsinki", default=["off"], help="include the Helsinki documents", **toggle
+    )
+    parser.add_argument(
+        "--tartu", default=["off"], help="include the Tartu documents", **toggle
+    )
+    parser.add_argument(
+        "--context",
+        action="append",
+        help=f'user context, repeatable (default: "{DEFAULT_CONTEXT}")',
+    )
+    parser.add_argument(
+        "--upload",
+        action="append",
+        default=[],
+        metavar="PDF",
+        help="PDF added to every job as an uploaded document, repeatable",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=MAX_CONCURRENT_REQUESTS,
+        help="jobs in flight at once",
+    )
+    parser.add_argument("--output-dir", default=str(OUTPUT_DIR))
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only write each job's prompt"
+    )
+    args = parser.parse_args()
+    load_dotenv()
+    # Per-job progress is printed; library diagnostics only when they matter.
+    configure_logging("WARNING")
+
+    institution_ids = (
+        list_institutions()
+        if args.institutions == ["all"]
+        else [int(institution_id) for institution_id in args.institutions]
+    )
+    jobs = build_jobs(
+        institution_ids,
+        _toggle(args.strategy),
+        _toggle(args.helsinki),
+        _toggle(args.tartu),
+        args.context or [DEFAULT_CONTEXT],
+        tuple((Path(path).name, content_hash(path)) for path in args.upload),
+    )
+    uploaded_documents = [
+        (Path(path).name, extract_text_cached(path)) for path in args.upload
+    ]
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    print(f"{len(jobs)} jobs, reports in {output_dir}")
+
+    if args.dry_run:
+        for job in jobs:
+            write_prompt(job, output_dir, uploaded_documents)
+        print(f"Wrote {len(jobs)} prompts")
+        return
+
+    started = time.perf_counter()
+    try:
+        counts = asyncio.run(
+            run_batch(jobs, output_dir, uploaded_documents, max(1, args.concurrency))
+        )
+    except KeyboardInterrupt:
+        print("Interrupted; run again with the same arguments to continue.")
+        raise SystemExit(130)
+    print(
+        f"Finished in {time.perf_counter() - started:.1f}s: {counts['done']} done, "
+        f"{counts['skipped']} skipped, {counts['failed']} failed"
+    )
+    if counts["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
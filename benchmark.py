@@ -0,0 +1,512 @@
+"""Offline benchmarks of the hot paths on synthetic data at several scales.
+
+Synthetic survey groups, PDF documents and conversations are generated once
+under ``--data-dir`` and reused by later runs. Every case then runs in its
+own Python process and temporary working directory, so caches start cold and
+the reported peak memory belongs to that case alone. The model is never
+called over the network: the end-to-end request case streams from the local
+``fake_openai_server``.
+
+    uv run python benchmark.py                          # quick scale
+    uv run python benchmark.py --scale full -o benchmark_results.json
+    uv run python benchmark.py --compare old.json benchmark_results.json
+
+Results are written as sorted, indented JSON so two runs can be compared
+with ``git diff`` or ``--compare``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+REPO_DIR = Path(__file__).resolve().parent
+DATA_DIR = REPO_DIR / ".cache" / "benchmark"
+
+SCALES = {
+    # Tiny inputs that still take every code path; used by the test suite.
+    "smoke": {"respondents": [200], "pages": [30], "messages": [4]},
+    "quick": {"respondents": [10_000], "pages": [50], "messages": [200]},
+    "full": {
+        "respondents": [10_000, 100_000, 500_000],
+        "pages": [50, 200, 1000],
+        "messages": [200],
+    },
+}
+# JSON exports take about 4 KB per respondent; larger groups are columnar only.
+JSON_MAX_RESPONDENTS = 10_000
+INSTITUTIONS = 120
+MISSING_SHARE = 0.05
+SEED = 20
+
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+# ASCII only, so the synthetic PDFs can use a base-14 font.
+WORDS = (
+    "digitalna transformacija sveuciliste nastava ucenje istrazivanje suradnja "
+    "infrastruktura usluge kiberneticka sigurnost umjetna inteligencija strategija "
+    "studenti nastavnici uprava kompetencije razvoj podrska platforma podaci "
+    "kvaliteta procesi ciljevi mjere pokazatelji provedba financiranje oprema "
+    "mreza sustav obrazovanje inovacije partnerstvo europska digitalne vjestine"
+).split()
+
+
+@dataclass
+class BenchmarkCase:
+    name: str
+    factory: Callable[..., Callable[[], Optional[Dict]]]
+    params: Dict = field(default_factory=dict)
+
+
+# --- synthetic data ---------------------------------------------------------
+
+
+def survey_dir(data_dir: Path, respondents: int) -> Path:
+    return data_dir / "survey" / str(respondents)
+
+
+def pdf_path(data_dir: Path, pages: int) -> Path:
+    return data_dir / "pdf" / f"synthetic_{pages}p.pdf"
+
+
+def generate_survey(data_dir: Path, respondents: int) -> Path:
+    """Write every survey group with ``respondents`` random answers each."""
+    import numpy as np
+
+    from survey_columns import (
+        MISSING_ANSWER,
+        SURVEY_DIR,
+        SurveyColumns,
+        columns_to_records,
+        load_survey_columns,
+        write_survey_columns,
+    )
+    from survey_store import CATEGORIES
+
+    root = survey_dir(data_dir, respondents)
+    if (root / "done").exists():
+        return root
+
+    rng = np.random.default_rng(SEED)
+    institution_ids = np.arange(1, INSTITUTIONS + 1, dtype=np.int32)
+    for category in CATEGORIES:
+        template = load_survey_columns(REPO_DIR / SURVEY_DIR / category)
+        answers = rng.integers(
+            1, 6, size=(respondents, len(template.question_ids)), dtype=np.int8
+        )
+        answers[rng.random(answers.shape) < MISSING_SHARE] = MISSING_ANSWER
+        columns = SurveyColumns(
+            answers=answers,
+            institution_ids=rng.choice(institution_ids, size=respondents),
+            responder_ids=np.arange(1, respondents + 1, dtype=np.int32),
+            question_ids=template.question_ids,
+            question_texts=template.question_texts,
+        )
+        write_survey_columns(root / "survey_data" / category, columns)
+        if respondents <= JSON_MAX_RESPONDENTS:
+            (root / "json_data").mkdir(parents=True, exist_ok=True)
+            with (root / "json_data" / f"{category}.json").open(
+                "w", encoding="utf-8"
+            ) as json_file:
+                json.dump(columns_to_records(columns), json_file, ensure_ascii=False)
+
+    (root / "done").touch()
+    print(f"Generated {respondents} respondents per survey group in {root}")
+    return root
+
+
+def generate_pdf(data_dir: Path, pages: int) -> Path:
+    """Write a ``pages``-page PDF of pseudo-Croatian paragraphs."""
+    import pymupdf
+
+    path = pdf_path(data_dir, pages)
+    if path.exists():
+        return path
+
+    rng = random.Random(SEED + pages)
+    document = pymupdf.open()
+    for page_number in range(pages):
+        page = document.new_page()
+        paragraphs = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 90)))
+            for _ in range(5)
+        ]
+        text = f"Poglavlje {page_number + 1}\n\n" + "\n\n".join(paragraphs)
+        page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=9)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document.save(path, garbage=4, deflate=True)
+    document.close()
+    print(f"Generated {pages}-page PDF {path}")
+    return path
+
+
+def synthetic_conversation(messages: int) -> List[Dict]:
+    """Alternate short questions with stub-model markdown answers."""
+    rng = random.Random(SEED + messages)
+    conversation = []
+    for number in range(messages):
+        if number % 2 == 0:
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+            conversation.append({"role": "user", "content": words.capitalize() + "?"})
+            continue
+        sections = []
+        for section in range(3):
+            bullets = "\n".join(
+                f"- **{rng.choice(WORDS)}**: "
+                + " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 25)))
+                for _ in range(4)
+            )
+            sections.append(f"## Preporuka {section + 1}\n\n{bullets}")
+        conversation.append({"role": "assistant", "content": "\n\n".join(sections)})
+    return conversation
+
+
+# --- cases ------------------------------------------------------------------
+# A factory prepares its inputs (untimed) inside the case's working directory
+# and returns the function to time; that function may return extra fields.
+
+
+def _link_survey(data_dir: Path, respondents: int) -> None:
+    os.symlink(survey_dir(data_dir, respondents) / "survey_data", "survey_data")
+
+
+def _calculate_averages_case(data_dir: Path, respondents: int, source: str):
+    from utils import calculate_averages
+
+    root = survey_dir(data_dir, respondents)
+    path = (
+        root / "json_data" / "studenti.json"
+        if source == "json"
+        else root / "survey_data" / "studenti"
+    )
+
+    def run():
+        averages = calculate_averages(path)
+        return {"questions": len(averages["averages"])}
+
+    return run
+
+
+def _extract_text_case(data_dir: Path, pages: int):
+    from utils import extract_text_from_pdf
+
+    path = pdf_path(data_dir, pages)
+
+    def run():
+        return {"chars": len(extract_text_from_pdf(path))}
+
+    return run
+
+
+def _build_prompt_case(data_dir: Path, respondents: int, pages: int):
+    from prompt_builder import DEFAULT_INSTITUTION_ID, build_analysis_prompt
+    from utils import extract_text_from_pdf
+
+    _link_survey(data_dir, respondents)
+    uploaded = [("sinteticki.pdf", extract_text_from_pdf(pdf_path(data_dir, pages)))]
+
+    def run():
+        prompt = build_analysis_prompt(
+            "Poseban naglasak na nastavi i kibernetičkoj sigurnosti.",
+            include_pdf=True,
+            include_helsinki=True,
+            include_tartu=False,
+            uploaded_documents=uploaded,
+            institution_id=DEFAULT_INSTITUTION_ID,
+        )
+        return {"prompt_chars": len(prompt)}
+
+    return run
+
+
+def _conversation_pdf_case(data_dir: Path, messages: int):
+    from utils import generate_conversation_pdf
+
+    conversation = synthetic_conversation(messages)
+
+    def run():
+        return {"pdf_bytes": len(generate_conversation_pdf(conversation))}
+
+    return run
+
+
+def _analysis_request_case(data_dir: Path, respondents: int):
+    from fake_openai_server import FakeResponsesConfig, serve_in_thread
+
+    _link_survey(data_dir, respondents)
+    _, base_url = serve_in_thread(
+        FakeResponsesConfig(first_token_delay=0.0, chunk_delay=0.0)
+    )
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+
+    from analysis import stream_openai_response
+
+    def run():
+        started = time.perf_counter()
+        first_token = None
+        output_chars = 0
+        for chunk in stream_openai_response(
+            [{"role": "user", "content": "Pokreni analizu."}],
+            True,
+            True,
+            False,
+            session_id="benchmark",
+        ):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            output_chars += len(chunk)
+        return {"ttft_s": round(first_token, 4), "output_chars": output_chars}
+
+    return run
+
+
+def build_cases(scale: Dict) -> List[BenchmarkCase]:
+    respondents, pages, messages = (
+        scale["respondents"],
+        scale["pages"],
+        scale["messages"],
+    )
+    cases = []
+    for count in respondents:
+        cases.append(
+            BenchmarkCase(
+                f"calculate_averages/columnar/{count}",
+                _calculate_averages_case,
+                {"respondents": count, "source": "columnar"},
+            )
+        )
+        if count <= JSON_MAX_RESPONDENTS:
+            cases.append(
+                BenchmarkCase(
+                    f"calculate_averages/json/{count}",
+                    _calculate_averages_case,
+                    {"respondents": count, "source": "json"},
+                )
+            )
+    for count in pages:
+        cases.append(
+            BenchmarkCase(
+                f"extract_text_from_pdf/{count}p", _extract_text_case, {"pages": count}
+            )
+        )
+    # Vary one dimension at a time around the smallest scale.
+    prompt_scales = [(count, pages[0]) for count in respondents]
+    prompt_scales += [(respondents[0], count) for count in pages[1:]]
+    for count, page_count in prompt_scales:
+        cases.append(
+            BenchmarkCase(
+                f"build_analysis_prompt/{count}r-{page_count}p",
+                _build_prompt_case,
+                {"respondents": count, "pages": page_count},
+            )
+        )
+    for count in messages:
+        cases.append(
+            BenchmarkCase(
+                f"generate_conversation_pdf/{count}msg",
+                _conversation_pdf_case,
+                {"messages": count},
+            )
+        )
+    cases.append(
+        BenchmarkCase(
+            f"analysis_request/{respondents[0]}r",
+            _analysis_request_case,
+            {"respondents": respondents[0]},
+        )
+    )
+    return cases
+
+
+# --- running ----------------------------------------------------------------
+
+
+def _max_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def run_case(case: BenchmarkCase, data_dir: Path, repeat: int) -> Dict:
+    """Time ``case`` in a fresh working directory (called in the child process)."""
+    workspace = Path(tempfile.mkdtemp(prefix="benchmark-"))
+    os.chdir(workspace)
+    os.symlink(REPO_DIR / "assets", "assets")
+    try:
+        function = case.factory(data_dir, **case.params)
+        baseline_rss = _max_rss_mb()
+        timings = []
+        extra: Dict = {}
+        for _ in range(repeat):
+            started = time.perf_counter()
+            extra = function() or {}
+            timings.append(time.perf_counter() - started)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    peak_rss = _max_rss_mb()
+    timings_sorted = sorted(timings)
+    return {
+        "first_s": round(timings[0], 4),
+        "median_s": round(timings_sorted[len(timings) // 2], 4),
+        "min_s": round(timings_sorted[0], 4),
+        "runs": repeat,
+        "peak_rss_mb": round(peak_rss, 1),
+        "rss_growth_mb": round(peak_rss - baseline_rss, 1),
+        # Process-pool workers (parallel PDF extraction) are accounted separately.
+        "peak_child_rss_mb": round(_max_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        **extra,
+    }
+
+
+def prepare_data(scale: Dict, data_dir: Path) -> None:
+    for respondents in scale["respondents"]:
+        generate_survey(data_dir, respondents)
+    for pages in scale["pages"]:
+        generate_pdf(data_dir, pages)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    scale_name: str, data_dir: Path, repeat: int, only: Optional[str] = None
+) -> Dict:
+    """Run every case of a scale in its own process and collect the results."""
+    scale = SCALES[scale_name]
+    prepare_data(scale, data_dir)
+
+    env = dict(os.environ, TELEMETRY="0", RESPONSE_CACHE="0", PYTHONHASHSEED="0")
+    results = {}
+    for case in build_cases(scale):
+        if only and only not in case.name:
+            continue
+        print(f"Running {case.name}...", flush=True)
+        completed = subprocess.run(
+            [
+                sys.executable,
+                str(Path(__file__).resolve()),
+                "--scale",
+                scale_name,
+                "--data-dir",
+                str(data_dir),
+                "--repeat",
+                str(repeat),
+                "--run-case",
+                case.name,
+            ],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        lines = [
+            line[len(RESULT_MARKER):]
+            for line in completed.stdout.splitlines()
+            if line.startswith(RESULT_MARKER)
+        ]
+        if completed.returncode != 0 or not lines:
+            print(completed.stderr[-2000:])
+            results[case.name] = {"error": f"exit status {completed.returncode}"}
+            continue
+        results[case.name] = json.loads(lines[-1])
+        print(
+            f"  median {results[case.name]['median_s']:.3f}s, "
+            f"peak RSS {results[case.name]['peak_rss_mb']:.0f} MB"
+        )
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale": scale_name,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(old_path: Path, new_path: Path) -> None:
+    """Print median time and peak memory changes between two result files."""
+    old = json.loads(old_path.read_text(encoding="utf-8"))["results"]
+    new = json.loads(new_path.read_text(encoding="utf-8"))["results"]
+    print(f"{'case':<52} {'old s':>9} {'new s':>9} {'ratio':>7} {'Δ peak MB':>10}")
+    for name in sorted(set(old) | set(new)):
+        before, after = old.get(name, {}), new.get(name, {})
+        if "median_s" not in before or "median_s" not in after:
+            print(f"{name:<52} {'only in ' + ('new' if name in new else 'old'):>9}")
+            continue
+        ratio = after["median_s"] / before["median_s"] if before["median_s"] else 0.0
+        print(
+            f"{name:<52} {before['median_s']:>9.4f} {after['median_s']:>9.4f} "
+            f"{ratio:>6.2f}x {after['peak_rss_mb'] - before['peak_rss_mb']:>+10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="quick")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=str(DATA_DIR))
+    parser.add_argument(
+        "-o", "--output", default="benchmark_results.json", help="results file"
+    )
+    parser.add_argument("--only", help="run only cases whose name contains this")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="compare two results files instead of running",
+    )
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(Path(args.compare[0]), Path(args.compare[1]))
+        return
+
+    data_dir = Path(args.data_dir).resolve()
+    if args.run_case:
+        case = next(
+            case
+            for case in build_cases(SCALES[args.scale])
+            if case.name == args.run_case
+        )
+        result = run_case(case, data_dir, args.repeat)
+        print(RESULT_MARKER + json.dumps(result), flush=True)
+        return
+
+    report = run_benchmarks(args.scale, data_dir, args.repeat, args.only)
+    output = Path(args.output)
+    output.write_text(
+        json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False) + "\n",
+        encoding="utf-8",
+    )
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Request layout for the initial analysis and follow-up questions.
+
+The initial request sends the analysis prompt as its first input item, with
+the large static material (documents, survey data, instructions) ahead of
+the user's own context so identical configurations share a cacheable prefix.
+Follow-ups chain onto the stored previous response and only send the new
+question plus any documents uploaded since. When that stored state is no
+longer available, the fallback replays the conversation behind the same
+first input item, so the provider-side prompt cache can still serve it.
+
+Long sessions are compacted: once the turns after the analysis prompt grow
+past ``COMPACTION_THRESHOLD_TOKENS``, older turns are replaced by a summary
+that is computed once, extended incrementally and reused on later turns.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from prompt_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Once earlier turns exceed this many estimated tokens they are folded into a
+# summary; the newest COMPACTION_KEEP_MESSAGES messages always stay verbatim.
+COMPACTION_THRESHOLD_TOKENS = int(
+    os.environ.get("COMPACTION_THRESHOLD_TOKENS", "12000")
+)
+COMPACTION_KEEP_MESSAGES = int(os.environ.get("COMPACTION_KEEP_MESSAGES", "4"))
+
+SUMMARY_INSTRUCTIONS = """Sažmite dosadašnji razgovor sa savjetnikom za digitalnu transformaciju visokog učilišta.
+- Zadržite ključne nalaze i preporuke iz analize po područjima
+- Zadržite sve činjenice, brojke, odluke i kontekst koje je korisnik naveo
+- Zadržite otvorena pitanja i dogovorene sljedeće korake
+- Pišite sažeto, u natuknicama, na hrvatskom jeziku"""
+
+FOLLOW_UP_INSTRUCTIONS = """Upute za odgovor:
+- Odgovorite na korisnikovo najnovije pitanje ili komentar
+- Ako korisnik daje nove informacije, kontekst ili uvide koji bi mogli utjecati na analizu, ponudite mu izradu nove/ažurirane analize i preporuka
+- Pitajte korisnika: "Želite li da napravim novu analizu i preporuke na temelju ovih novih informacija?"
+- Koristite Markdown formatiranje za bolju čitljivost"""
+
+
+def new_conversation_state() -> Dict:
+    """Return the per-session state used to chain follow-up requests."""
+    return {
+        "previous_response_id": None,
+        "sent_documents": set(),
+        # Summary of messages[1:summary_upto]; later turns are kept verbatim.
+        "summary": "",
+        "summary_upto": 1,
+    }
+
+
+def prompt_cache_key(prefix: str) -> str:
+    """Return a routing key shared by all requests starting with ``prefix``."""
+    return "carnet-tbi-" + hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:32]
+
+
+def _message(role: str, text: str) -> Dict:
+    return {"role": role, "content": text}
+
+
+def _documents_text(documents: List[Tuple[str, str]]) -> str:
+    text = ""
+    for filename, document_text in documents:
+        trimmed_text = document_text.strip()
+        if not trimmed_text:
+            logger.warning("Skipping empty user document in follow-up: %s", filename)
+            continue
+        logger.debug(
+            "Adding user document to follow-up conversation: %s with %d characters",
+            filename,
+            len(trimmed_text),
+        )
+        text += f"[USER PDF] {filename}:\n{trimmed_text}\n\n"
+    return text
+
+
+def _follow_up_text(question: str, new_documents: List[Tuple[str, str]]) -> str:
+    text = f"{question}\n\n"
+    documents_text = _documents_text(new_documents)
+    if documents_text:
+        text += f"Novi korisnički PDF dokumenti za kontekst:\n{documents_text}"
+    return text + FOLLOW_UP_INSTRUCTIONS
+
+
+def unsent_documents(
+    state: Dict, uploaded_documents: Optional[List[Tuple[str, str]]]
+) -> List[Tuple[str, str]]:
+    """Return uploaded documents the model has not seen in this conversation."""
+    return [
+        (filename, text)
+        for filename, text in uploaded_documents or []
+        if filename not in state["sent_documents"]
+    ]
+
+
+def initial_input(analysis_prompt: str) -> List[Dict]:
+    """Return the input items of the initial analysis request."""
+    return [_message("user", analysis_prompt)]
+
+
+def chained_follow_up_input(
+    question: str, new_documents: List[Tuple[str, str]]
+) -> List[Dict]:
+    """Return the input of a follow-up sent with ``previous_response_id``."""
+    return [_message("user", _follow_up_text(question, new_documents))]
+
+
+def needs_compaction(state: Dict, messages: List[Dict]) -> bool:
+    """Return True if the turns not yet summarised exceed the threshold."""
+    history = messages[state["summary_upto"] : -1]
+    tokens = estimate_tokens(state["summary"]) + sum(
+        estimate_tokens(message["content"]) for message in history
+    )
+    return (
+        tokens > COMPACTION_THRESHOLD_TOKENS
+        and len(history) > COMPACTION_KEEP_MESSAGES
+    )
+
+
+def compaction_input(state: Dict, messages: List[Dict]) -> Tuple[List[Dict], int]:
+    """Return the summarisation request input and the new ``summary_upto``.
+
+    The previous summary is extended with the turns that have aged out of
+    the verbatim window, so each turn is summarised only once.
+    """
+    summary_upto = len(messages) - 1 - COMPACTION_KEEP_MESSAGES
+    text = ""
+    if state["summary"]:
+        text += f"Dosadašnji sažetak:\n{state['summary']}\n\n"
+    text += "Nastavak razgovora:\n"
+    for message in messages[state["summary_upto"] : summary_upto]:
+        text += f"{message['role']}: {message['content']}\n\n"
+    return [_message("user", f"{text}{SUMMARY_INSTRUCTIONS}")], summary_upto
+
+
+def replayed_follow_up_input(
+    analysis_prompt: str,
+    messages: List[Dict],
+    uploaded_documents: List[Tuple[str, str]],
+    state: Optional[Dict] = None,
+) -> List[Dict]:
+    """Return a self-contained follow-up, used after expiry or compaction.
+
+    The rebuilt analysis prompt stays the first item so the request shares
+    its prefix with the original analysis. It is followed by the summary of
+    compacted turns (if any), the remaining turns verbatim, and the newest
+    question with all uploaded documents attached.
+    """
+    state = state or new_conversation_state()
+    items = initial_input(analysis_prompt)
+    if state["summary"]:
+        items.append(
+            _message("user", f"Sažetak dosadašnjeg razgovora:\n{state['summary']}")
+        )
+    for message in messages[state["summary_upto"] : -1]:
+        items.append(_message(message["role"], message["content"]))
+    items.append(
+        _message("user", _follow_up_text(messages[-1]["content"], uploaded_documents))
+    )
+    return items
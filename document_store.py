@@ -0,0 +1,155 @@
+"""Process-wide, content-addressed store for extracted document text.
+
+Sessions reference documents by content hash, so fifty participants
+uploading the same ministry document share one copy of its text. Every
+holder takes a reference with ``acquire`` and drops it with ``release``; a
+document whose last reference is gone is deleted. Resident text is capped by
+``DOCUMENT_STORE_MAX_MB``: the least recently used documents are spilled to
+``.cache/documents`` and read back on their next use.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from telemetry import register_gauges
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_STORE_MAX_BYTES = (
+    int(os.environ.get("DOCUMENT_STORE_MAX_MB", "128")) * 1024 * 1024
+)
+SPILL_DIR = Path(os.environ.get("DOCUMENT_STORE_SPILL_DIR", ".cache/documents"))
+
+
+class _Entry:
+    def __init__(self):
+        self.owners: Set[str] = set()
+        self.text: Optional[str] = None
+        self.size = 0
+        self.spilled = False
+
+
+class DocumentStore:
+    """Reference-counted text entries with an LRU cap on resident bytes."""
+
+    def __init__(
+        self,
+        max_resident_bytes: int = DOCUMENT_STORE_MAX_BYTES,
+        spill_dir: Path = SPILL_DIR,
+    ):
+        self.max_resident_bytes = max_resident_bytes
+        self.spill_dir = spill_dir
+        self._entries: Dict[str, _Entry] = {}
+        # content hash -> None, least recently used first
+        self._resident: "OrderedDict[str, None]" = OrderedDict()
+        self._resident_bytes = 0
+        self._spills = 0
+        self._loads = 0
+        self._lock = threading.Lock()
+
+    def _spill_path(self, content_hash: str) -> Path:
+        return self.spill_dir / f"{content_hash}.txt"
+
+    def acquire(self, content_hash: str, owner: str) -> None:
+        """Record that ``owner`` holds ``content_hash``; text may follow later."""
+        with self._lock:
+            self._entries.setdefault(content_hash, _Entry()).owners.add(owner)
+
+    def release(self, content_hash: str, owner: str) -> bool:
+        """Drop ``owner``'s reference; return True if the document was deleted."""
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is None:
+                return False
+            entry.owners.discard(owner)
+            if entry.owners:
+                return False
+            del self._entries[content_hash]
+            if content_hash in self._resident:
+                del self._resident[content_hash]
+                self._resident_bytes -= entry.size
+        if entry.spilled:
+            self._spill_path(content_hash).unlink(missing_ok=True)
+        logger.info("Dropped document %s from the store", content_hash[:12])
+        return True
+
+    def put(self, content_hash: str, text: str) -> None:
+        """Store the text of a document that has at least one reference."""
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is None or entry.text is not None or entry.spilled:
+                return
+            entry.text = text
+            entry.size = sys.getsizeof(text)
+            self._make_resident(content_hash, entry)
+
+    def get(self, content_hash: str) -> str:
+        """Return a document's text, reading it back from disk if spilled."""
+        with self._lock:
+            entry = self._entries[content_hash]
+            if entry.text is not None:
+                self._resident.move_to_end(content_hash)
+                return entry.text
+            if not entry.spilled:
+                raise KeyError(f"Document {content_hash} has no text yet")
+            text = self._spill_path(content_hash).read_text(encoding="utf-8")
+            self._loads += 1
+            entry.text = text
+            self._make_resident(content_hash, entry)
+            return text
+
+    def _make_resident(self, content_hash: str, entry: _Entry) -> None:
+        self._resident[content_hash] = None
+        self._resident_bytes += entry.size
+        # The newest entry always stays resident, even if it alone exceeds the cap.
+        while (
+            self._resident_bytes > self.max_resident_bytes and len(self._resident) > 1
+        ):
+            victim_hash, _ = self._resident.popitem(last=False)
+            self._spill(victim_hash, self._entries[victim_hash])
+
+    def _spill(self, content_hash: str, entry: _Entry) -> None:
+        if not entry.spilled:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=self.spill_dir, suffix=".tmp", delete=False
+            ) as tmp_file:
+                tmp_file.write(entry.text)
+            os.replace(tmp_file.name, self._spill_path(content_hash))
+            entry.spilled = True
+        entry.text = None
+        self._resident_bytes -= entry.size
+        self._spills += 1
+        logger.info(
+            "Spilled document %s to disk (%s bytes)", content_hash[:12], entry.size
+        )
+
+    def stats(self) -> Dict:
+        """Return entry counts, resident and spilled bytes and spill activity."""
+        with self._lock:
+            return {
+                "documents": len(self._entries),
+                "references": sum(
+                    len(entry.owners) for entry in self._entries.values()
+                ),
+                "resident_documents": len(self._resident),
+                "resident_bytes": self._resident_bytes,
+                "max_resident_bytes": self.max_resident_bytes,
+                "spilled_documents": sum(
+                    1
+                    for entry in self._entries.values()
+                    if entry.spilled and entry.text is None
+                ),
+                "spills": self._spills,
+                "loads_from_disk": self._loads,
+            }
+
+
+DOCUMENT_STORE = DocumentStore()
+register_gauges("document_store", DOCUMENT_STORE.stats)
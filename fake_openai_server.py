@@ -0,0 +1,260 @@
+"""Local stand-in for the OpenAI Responses API, for offline runs and load tests.
+
+Serves ``POST /v1/responses`` with the same server-sent event types the app
+consumes (``response.created``, ``response.output_text.delta``,
+``response.completed``), or a plain JSON response when ``stream`` is false.
+Stored response ids are kept in memory, so ``previous_response_id`` chaining
+works and an unknown id gets a 404 like an expired response.
+
+Run it and point the app at it::
+
+    uv run python fake_openai_server.py --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake uv run streamlit run app.py
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+DEFAULT_TEXT = (
+    "## Analiza digitalne zrelosti\n\n"
+    "Ovo je odgovor lokalnog testnog poslužitelja. "
+    "Sadržaj se šalje u dijelovima kako bi se provjerio prikaz toka.\n"
+)
+
+
+class FakeResponsesConfig:
+    """Behaviour of the fake endpoint; attributes may be changed while serving."""
+
+    def __init__(
+        self,
+        text: str = DEFAULT_TEXT,
+        chunk_chars: int = 16,
+        first_token_delay: float = 0.2,
+        chunk_delay: float = 0.01,
+        fail_first: int = 0,
+        fail_status: int = 429,
+        fail_stream_first: int = 0,
+    ):
+        self.text = text
+        self.chunk_chars = chunk_chars
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        # The first ``fail_first`` requests are answered with ``fail_status``.
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        # The first ``fail_stream_first`` streams break off with a server error
+        # event after ``response.created``, once the request has been accepted.
+        self.fail_stream_first = fail_stream_first
+        self.requests = 0
+        self.streams = 0
+        self.response_ids = set()
+        self.lock = threading.Lock()
+
+
+def _response_object(response_id: str, model: str, text: str, status: str) -> Dict:
+    output = []
+    if status == "completed":
+        output.append(
+            {
+                "id": f"msg_{response_id[5:]}",
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        )
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": status,
+        "output": output,
+        "usage": {
+            "input_tokens": 0,
+            "output_tokens": len(text) // 4,
+            "total_tokens": len(text) // 4,
+        },
+    }
+
+
+def _make_handler(config: FakeResponsesConfig):
+    class FakeResponsesHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: Dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_event(self, payload: Dict) -> None:
+            self.wfile.write(
+                f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n".encode(
+                    "utf-8"
+                )
+            )
+            self.wfile.flush()
+
+        def _error(self, status: int, message: str, code: str) -> None:
+            self._send_json(
+                status, {"error": {"message": message, "type": code, "code": code}}
+            )
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self.path.rstrip("/") != "/v1/responses":
+                self._error(404, f"Unknown path {self.path}", "not_found")
+                return
+
+            with config.lock:
+                config.requests += 1
+                failing = config.requests <= config.fail_first
+                previous_id = request.get("previous_response_id")
+                unknown_previous = (
+                    previous_id is not None and previous_id not in config.response_ids
+                )
+                response_id = f"resp_{uuid.uuid4().hex}"
+                config.response_ids.add(response_id)
+
+            if failing:
+                self._error(
+                    config.fail_status, "Injected failure", "rate_limit_exceeded"
+                )
+                return
+            if unknown_previous:
+                self._error(
+                    404, f"Previous response {previous_id} not found", "not_found"
+                )
+                return
+
+            model = request.get("model", "fake-model")
+            if not request.get("stream"):
+                time.sleep(config.first_token_delay)
+                self._send_json(
+                    200, _response_object(response_id, model, config.text, "completed")
+                )
+                return
+
+            with config.lock:
+                config.streams += 1
+                failing_stream = config.streams <= config.fail_stream_first
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            sequence = 0
+            self._send_event(
+                {
+                    "type": "response.created",
+                    "sequence_number": sequence,
+                    "response": _response_object(
+                        response_id, model, "", "in_progress"
+                    ),
+                }
+            )
+            if failing_stream:
+                self._send_event(
+                    {
+                        "type": "error",
+                        "sequence_number": sequence + 1,
+                        "error": {
+                            "type": "server_error",
+                            "code": "server_error",
+                            "message": "Injected stream failure",
+                        },
+                    }
+                )
+                return
+            time.sleep(config.first_token_delay)
+            text = config.text
+            for start in range(0, len(text), config.chunk_chars):
+                sequence += 1
+                self._send_event(
+                    {
+                        "type": "response.output_text.delta",
+                        "sequence_number": sequence,
+                        "item_id": f"msg_{response_id[5:]}",
+                        "output_index": 0,
+                        "content_index": 0,
+                        "delta": text[start : start + config.chunk_chars],
+                        "logprobs": [],
+                    }
+                )
+                time.sleep(config.chunk_delay)
+            self._send_event(
+                {
+                    "type": "response.completed",
+                    "sequence_number": sequence + 1,
+                    "response": _response_object(response_id, model, text, "completed"),
+                }
+            )
+
+    return FakeResponsesHandler
+
+
+def serve_in_thread(
+    config: FakeResponsesConfig = None, host: str = "127.0.0.1", port: int = 0
+) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the fake endpoint in a daemon thread; return it and its base URL."""
+    server = ThreadingHTTPServer(
+        (host, port), _make_handler(config or FakeResponsesConfig())
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    parser.add_argument(
+        "--fail-first",
+        type=int,
+        default=0,
+        help="answer the first N requests with --fail-status to exercise retries",
+    )
+    parser.add_argument("--fail-status", type=int, default=429)
+    parser.add_argument(
+        "--fail-stream-first",
+        type=int,
+        default=0,
+        help="break off the first N streams with a server error event",
+    )
+    args = parser.parse_args()
+
+    config = FakeResponsesConfig(
+        first_token_delay=args.first_token_delay,
+        chunk_delay=args.chunk_delay,
+        fail_first=args.fail_first,
+        fail_status=args.fail_status,
+        fail_stream_first=args.fail_stream_first,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(config))
+    print(f"Fake Responses API on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
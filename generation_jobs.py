@@ -0,0 +1,167 @@
+"""Background generation jobs that outlive Streamlit reruns.
+
+A job consumes a response generator in its own thread and accumulates the
+streamed text, so a widget interaction that reruns the script no longer
+abandons a paid request. The session keeps only the job id; each rerun
+re-attaches with ``follow_job``, which first yields the text produced so far
+and then new chunks as they arrive.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs nobody re-attached to are dropped after this many seconds.
+JOB_RETENTION_SECONDS = float(
+    os.environ.get("GENERATION_JOB_RETENTION_SECONDS", "3600")
+)
+POLL_INTERVAL_SECONDS = 0.1
+
+StatusCallback = Callable[[Optional[str]], None]
+ChunkFactory = Callable[[StatusCallback], Iterable[str]]
+
+
+class GenerationJob:
+    """Text and status of one response being generated in the background."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.chunks: List[str] = []
+        self.status_message: Optional[str] = None
+        self.done = False
+        self.cancelled = False
+        self.error: Optional[Exception] = None
+        self.finished_at: Optional[float] = None
+        self.changed = threading.Condition()
+
+    def set_status(self, message: Optional[str]) -> None:
+        """Record a progress message shown until the first text arrives."""
+        with self.changed:
+            self.status_message = message
+            self.changed.notify_all()
+
+    def text(self) -> str:
+        with self.changed:
+            return "".join(self.chunks)
+
+
+_jobs: Dict[str, GenerationJob] = {}
+_lock = threading.Lock()
+
+
+def _prune_finished_jobs() -> None:
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with _lock:
+        for job_id, job in list(_jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del _jobs[job_id]
+
+
+def _run(job: GenerationJob, make_chunks: ChunkFactory) -> None:
+    chunks = None
+    try:
+        chunks = make_chunks(job.set_status)
+        for chunk in chunks:
+            if job.cancelled:
+                logger.info("Generation job %s cancelled", job.job_id)
+                break
+            with job.changed:
+                job.chunks.append(chunk)
+                job.changed.notify_all()
+    except Exception as exc:  # surfaced to the session through follow_job
+        logger.exception("Generation job %s failed", job.job_id)
+        job.error = exc
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+        with job.changed:
+            job.done = True
+            job.finished_at = time.time()
+            job.changed.notify_all()
+
+
+def start_job(make_chunks: ChunkFactory) -> str:
+    """Start a job and return its id.
+
+    ``make_chunks`` receives the job's ``set_status`` callback and returns the
+    text chunks to consume; it is called in the background thread.
+    """
+    _prune_finished_jobs()
+    job = GenerationJob(uuid.uuid4().hex)
+    with _lock:
+        _jobs[job.job_id] = job
+    threading.Thread(
+        target=_run,
+        args=(job, make_chunks),
+        name=f"generation-{job.job_id[:8]}",
+        daemon=True,
+    ).start()
+    logger.debug("Started generation job %s", job.job_id)
+    return job.job_id
+
+
+def get_job(job_id: Optional[str]) -> Optional[GenerationJob]:
+    """Return the job with ``job_id``, or None once it has been collected."""
+    with _lock:
+        return _jobs.get(job_id) if job_id else None
+
+
+def follow_job(job_id: str, on_status: StatusCallback) -> Iterator[str]:
+    """Yield the job's text so far, then new chunks until it finishes.
+
+    ``on_status`` is called with the job's status message whenever it changes
+    while no text has arrived yet, and with ``None`` once text starts. The
+    job's exception, if any, is re-raised at the end.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return
+
+    sent = 0
+    shown_status = None
+    while True:
+        with job.changed:
+            while (
+                len(job.chunks) == sent
+                and not job.done
+                and job.status_message == shown_status
+            ):
+                job.changed.wait(POLL_INTERVAL_SECONDS)
+            new_chunks = job.chunks[sent:]
+            status_message = job.status_message
+            done = job.done
+
+        if not sent and not new_chunks and status_message != shown_status:
+            on_status(status_message)
+        shown_status = status_message
+        if new_chunks:
+            if not sent:
+                on_status(None)
+            sent += len(new_chunks)
+            yield "".join(new_chunks)
+        elif done:
+            break
+
+    if job.error is not None:
+        raise job.error
+
+
+def finish_job(job_id: str) -> Optional[str]:
+    """Forget a finished job and return its text, or None if it is unknown."""
+    with _lock:
+        job = _jobs.pop(job_id, None)
+    return job.text() if job is not None else None
+
+
+def cancel_job(job_id: Optional[str]) -> None:
+    """Stop consuming a job's stream and forget it."""
+    with _lock:
+        job = _jobs.pop(job_id, None) if job_id else None
+    if job is not None:
+        job.cancelled = True
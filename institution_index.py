@@ -0,0 +1,246 @@
+"""Precomputed per-institution aggregates for every survey group.
+
+The index stores, for each category, the question list and per-institution
+``count``/``sum``/``sumsq`` vectors aligned with it, plus a ``national`` entry
+summed over all institutions. ``signatures`` records the source file
+signatures each fingerprint was taken at, so a later process can reuse the
+fingerprint instead of rehashing unchanged sources. Any institution's averages (or the national
+baseline) are then a dictionary lookup and one division per question::
+
+    {
+      "sources": {category: fingerprint, ...},
+      "signatures": {category: [mtime_ns, size], ...},
+      "categories": {
+        category: {
+          "question_ids": [...], "question_texts": [...],
+          "institutions": {"20": {"respondents": n, "count": [...], ...}},
+          "national": {"respondents": n, "count": [...], "sum": [...], "sumsq": [...]}
+        }
+      }
+    }
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from survey_columns import MISSING_ANSWER, SurveyColumns
+from survey_store import (
+    AVERAGES_DIR,
+    CATEGORIES,
+    atomic_write_json,
+    extend_source_hash,
+    load_category_columns,
+    remember_source_hash,
+    source_hash,
+    source_signature,
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = AVERAGES_DIR / "institution_index.json"
+
+_index_cache: Optional[Tuple[Tuple[Any, ...], Dict[str, Any]]] = None
+_lock = threading.Lock()
+
+
+def _aggregate(answers: np.ndarray) -> Dict[str, Any]:
+    answered = answers != MISSING_ANSWER
+    values = np.where(answered, answers, 0).astype(np.int64)
+    return {
+        "respondents": int(answers.shape[0]),
+        "count": answered.sum(axis=0).tolist(),
+        "sum": values.sum(axis=0).tolist(),
+        "sumsq": (values * values).sum(axis=0).tolist(),
+    }
+
+
+def build_category_index(columns: SurveyColumns) -> Dict[str, Any]:
+    """Group one category's answers by institution into count/sum/sumsq vectors."""
+    answers = np.asarray(columns.answers)
+    institution_ids = np.asarray(columns.institution_ids)
+
+    return {
+        "question_ids": list(columns.question_ids),
+        "question_texts": list(columns.question_texts),
+        "institutions": {
+            str(institution_id): _aggregate(answers[institution_ids == institution_id])
+            for institution_id in np.unique(institution_ids).tolist()
+        },
+        "national": _aggregate(answers),
+    }
+
+
+def build_institution_index() -> Dict[str, Any]:
+    """Build the index from the current survey sources and write it to disk."""
+    index: Dict[str, Any] = {"sources": {}, "signatures": {}, "categories": {}}
+    for category in CATEGORIES:
+        try:
+            columns = load_category_columns(category)
+        except FileNotFoundError:
+            continue
+        index["sources"][category] = source_hash(category)
+        index["signatures"][category] = list(source_signature(category))
+        index["categories"][category] = build_category_index(columns)
+
+    atomic_write_json(INDEX_PATH, index)
+    logger.info("Built institution index for %d categories", len(index["categories"]))
+    return index
+
+
+def _signatures() -> Tuple[Any, ...]:
+    signatures = []
+    for category in CATEGORIES:
+        try:
+            signatures.append(source_signature(category))
+        except FileNotFoundError:
+            signatures.append(None)
+    return tuple(signatures)
+
+
+def index_signature() -> Tuple[Any, ...]:
+    """Return the (mtime, size) signatures of the sources behind the index.
+
+    Cheap to compute; changes whenever any category's survey data changes,
+    so callers can use it to key caches derived from the index.
+    """
+    return _signatures()
+
+
+def get_institution_index() -> Dict[str, Any]:
+    """Return the index, rebuilding it only when a survey source has changed."""
+    global _index_cache
+
+    with _lock:
+        signatures = _signatures()
+        if _index_cache and _index_cache[0] == signatures:
+            return _index_cache[1]
+
+        try:
+            with INDEX_PATH.open("r", encoding="utf-8") as index_file:
+                index = json.load(index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = None
+
+        if index is not None:
+            for category, signature in index.get("signatures", {}).items():
+                remember_source_hash(category, signature, index["sources"][category])
+
+        current_sources = {
+            category: source_hash(category)
+            for category, signature in zip(CATEGORIES, signatures)
+            if signature is not None
+        }
+        if index is None or index["sources"] != current_sources:
+            index = build_institution_index()
+
+        _index_cache = (signatures, index)
+        return index
+
+
+def _rows_digest(delta: SurveyColumns) -> str:
+    digest = hashlib.sha256()
+    for array, dtype in (
+        (delta.answers, np.int8),
+        (delta.institution_ids, np.int32),
+        (delta.responder_ids, np.int32),
+    ):
+        digest.update(np.ascontiguousarray(array, dtype).tobytes())
+    return digest.hexdigest()
+
+
+def apply_delta(category: str, delta: SurveyColumns) -> Dict[str, Dict[str, Any]]:
+    """Fold newly appended respondents into the index without rereading old data.
+
+    Call after the rows have been appended to the category's source; the index
+    must have been current before the append. The source fingerprint is
+    extended with a digest of the appended rows only. Returns the category's
+    updated national averages.
+    """
+    global _index_cache
+
+    delta_index = build_category_index(delta)
+    with _lock:
+        if _index_cache is None:
+            raise RuntimeError("Load the institution index before applying a delta")
+        index = _index_cache[1]
+        category_index = index["categories"][category]
+        if category_index["question_ids"] != delta_index["question_ids"]:
+            raise ValueError(f"Delta questions do not match {category}")
+
+        entries = [(category_index["national"], delta_index["national"])]
+        for institution_id, delta_entry in delta_index["institutions"].items():
+            empty = [0] * len(delta_entry["count"])
+            entry = category_index["institutions"].setdefault(
+                institution_id,
+                {"respondents": 0, "count": empty, "sum": empty, "sumsq": empty},
+            )
+            entries.append((entry, delta_entry))
+
+        for entry, delta_entry in entries:
+            entry["respondents"] += delta_entry["respondents"]
+            for key in ("count", "sum", "sumsq"):
+                entry[key] = [a + b for a, b in zip(entry[key], delta_entry[key])]
+
+        index["sources"][category] = extend_source_hash(
+            category, index["sources"][category], _rows_digest(delta)
+        )
+        index.setdefault("signatures", {})[category] = list(source_signature(category))
+        atomic_write_json(INDEX_PATH, index)
+        _index_cache = (_signatures(), index)
+        return _averages(category_index, category_index["national"])
+
+
+def _averages(category_index: Dict[str, Any], entry: Dict[str, List[int]]):
+    averages = {}
+    question_texts = {}
+    for question_id, question_text, count, total in zip(
+        category_index["question_ids"],
+        category_index["question_texts"],
+        entry["count"],
+        entry["sum"],
+    ):
+        if count:
+            averages[question_id] = total / count
+            question_texts[question_id] = question_text
+    return {"averages": averages, "question_texts": question_texts}
+
+
+def list_institutions() -> List[int]:
+    """Return the IDs of all institutions with answers in any category."""
+    institution_ids = set()
+    for category_index in get_institution_index()["categories"].values():
+        institution_ids.update(int(key) for key in category_index["institutions"])
+    return sorted(institution_ids)
+
+
+def institution_averages(
+    category: str, institution_id: int
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Return one institution's averages for ``category``, or None if it has none."""
+    category_index = get_institution_index()["categories"].get(category)
+    if category_index is None:
+        return None
+    entry = category_index["institutions"].get(str(institution_id))
+    if entry is None:
+        return None
+    return _averages(category_index, entry)
+
+
+def national_averages(category: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Return the averages across all institutions for ``category``."""
+    category_index = get_institution_index()["categories"].get(category)
+    if category_index is None:
+        return None
+    return _averages(category_index, category_index["national"])
+
+
+def institution_respondents(category: str, institution_id: int) -> int:
+    """Return how many respondents of ``category`` belong to the institution."""
+    category_index = get_institution_index()["categories"].get(category, {})
+    entry = category_index.get("institutions", {}).get(str(institution_id))
+    return entry["respondents"] if entry else 0
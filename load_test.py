@@ -0,0 +1,601 @@
+"""Load test: many simulated users on one app instance, with a fake model.
+
+Starts the fake Responses API in-process and ``streamlit run app.py`` as a
+subprocess pointed at it, then drives ``--sessions`` concurrent browser
+sessions over Streamlit's own websocket protocol. Each session loads the
+page, uploads a PDF, asks for the initial analysis and ``--follow-ups``
+further questions, and exports the conversation to PDF. The report gives
+p50/p95 time to first token and other latencies as seen by the client, plus
+throughput and the server process' resident memory::
+
+    uv run python load_test.py --sessions 20 --first-token-delay 1.5
+
+Only the standard library and Streamlit's protobuf messages are used; the
+server is started without XSRF protection so the test client can upload.
+"""
+
+import argparse
+import asyncio
+import base64
+import http.client
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import FileURLsRequest
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from benchmark import DATA_DIR, generate_pdf
+from fake_openai_server import DEFAULT_TEXT, FakeResponsesConfig, serve_in_thread
+
+REPO_DIR = Path(__file__).resolve().parent
+INITIAL_PROMPT = "Pokreni analizu"
+PDF_BUTTON_LABEL = "📄 Pripremi PDF"
+ERROR_PREFIX = "Greška"
+
+
+# --- minimal websocket client (RFC 6455) ------------------------------------
+
+
+class _WebSocket:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host: str, port: int, path: str) -> "_WebSocket":
+        reader, writer = await asyncio.open_connection(host, port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(
+            (
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {host}:{port}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n"
+                "Sec-WebSocket-Protocol: streamlit\r\n\r\n"
+            ).encode()
+        )
+        response = await reader.readuntil(b"\r\n\r\n")
+        if b" 101 " not in response.split(b"\r\n", 1)[0]:
+            raise ConnectionError(f"Websocket handshake failed: {response[:200]!r}")
+        return cls(reader, writer)
+
+    def _send_frame(self, opcode: int, payload: bytes) -> None:
+        length = len(payload)
+        header = bytearray([0x80 | opcode])
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 1 << 16:
+            header.append(0x80 | 126)
+            header += struct.pack("!H", length)
+        else:
+            header.append(0x80 | 127)
+            header += struct.pack("!Q", length)
+        # Client frames must be masked.
+        mask = os.urandom(4)
+        key = (mask * (length // 4 + 1))[:length]
+        masked = (
+            int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")
+        ).to_bytes(length, "big")
+        self.writer.write(bytes(header) + mask + masked)
+
+    async def send(self, payload: bytes) -> None:
+        self._send_frame(0x2, payload)
+        await self.writer.drain()
+
+    async def recv(self) -> bytes:
+        message = bytearray()
+        while True:
+            head = await self.reader.readexactly(2)
+            fin, opcode, length = head[0] & 0x80, head[0] & 0x0F, head[1] & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            if head[1] & 0x80:
+                await self.reader.readexactly(4)  # servers do not mask; skip
+            payload = await self.reader.readexactly(length)
+            if opcode == 0x8:
+                raise ConnectionError("Websocket closed by the server")
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if fin:
+                return bytes(message)
+
+    async def close(self) -> None:
+        self._send_frame(0x8, struct.pack("!H", 1000))
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+# --- simulated browser session ----------------------------------------------
+
+
+class RunResult:
+    """What one script run sent back to the client."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.first_response_seconds: Optional[float] = None
+        self.response_chars = 0
+        self.errors: List[str] = []
+
+
+class BrowserSession:
+    """One browser tab: widget ids seen so far and widget values to resend."""
+
+    def __init__(self, host: str, port: int, response_marker: str):
+        self.host = host
+        self.port = port
+        self.response_marker = response_marker
+        self.websocket: Optional[_WebSocket] = None
+        self.session_id = ""
+        self.page_script_hash = ""
+        self.chat_input_id: Optional[str] = None
+        self.file_uploader_id: Optional[str] = None
+        self.buttons: Dict[str, str] = {}
+        self.download_urls: Dict[str, str] = {}
+        # Widget values the browser keeps sending on every rerun (uploads).
+        self.persistent_states: Dict[str, WidgetState] = {}
+        # Element positions that already showed model output in earlier runs.
+        self.response_paths = set()
+
+    async def connect(self) -> None:
+        self.websocket = await _WebSocket.connect(self.host, self.port, "/_stcore/stream")
+
+    async def close(self) -> None:
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    async def _send(self, back_msg: BackMsg) -> None:
+        await self.websocket.send(back_msg.SerializeToString())
+
+    async def _receive(self) -> ForwardMsg:
+        message = ForwardMsg()
+        message.ParseFromString(await self.websocket.recv())
+        return message
+
+    def _observe(self, message: ForwardMsg, result: RunResult, started: float) -> None:
+        kind = message.WhichOneof("type")
+        if kind == "new_session":
+            self.page_script_hash = message.new_session.page_script_hash
+            if message.new_session.initialize.session_id:
+                self.session_id = message.new_session.initialize.session_id
+            return
+        if kind != "delta" or message.delta.WhichOneof("type") != "new_element":
+            return
+
+        element = message.delta.new_element
+        element_type = element.WhichOneof("type")
+        if element_type == "chat_input":
+            self.chat_input_id = element.chat_input.id
+        elif element_type == "file_uploader":
+            self.file_uploader_id = element.file_uploader.id
+        elif element_type == "button":
+            self.buttons[element.button.label] = element.button.id
+        elif element_type == "download_button":
+            self.download_urls[element.download_button.label] = (
+                element.download_button.url
+            )
+        elif element_type == "exception":
+            result.errors.append(element.exception.message)
+        elif element_type == "alert" and element.alert.body.startswith(ERROR_PREFIX):
+            result.errors.append(element.alert.body)
+        elif element_type == "markdown" and self.response_marker in element.markdown.body:
+            path = tuple(message.metadata.delta_path)
+            if path in self.response_paths and result.first_response_seconds is None:
+                return  # conversation history re-rendered by this run
+            if result.first_response_seconds is None:
+                result.first_response_seconds = time.perf_counter() - started
+            self.response_paths.add(path)
+            result.response_chars = len(element.markdown.body)
+
+    async def rerun(self, *triggers: WidgetState) -> RunResult:
+        """Send a rerun with the kept widget values plus ``triggers``; wait for it."""
+        back_msg = BackMsg()
+        client_state = back_msg.rerun_script
+        client_state.page_script_hash = self.page_script_hash
+        for state in list(self.persistent_states.values()) + list(triggers):
+            client_state.widget_states.widgets.append(state)
+
+        result = RunResult()
+        started = time.perf_counter()
+        await self._send(back_msg)
+        while True:
+            message = await self._receive()
+            self._observe(message, result, started)
+            if (
+                message.WhichOneof("type") == "script_finished"
+                and message.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN
+            ):
+                break
+        result.seconds = time.perf_counter() - started
+        return result
+
+    async def ask(self, prompt: str) -> RunResult:
+        state = WidgetState(id=self.chat_input_id)
+        if "chat_input_value" in WidgetState.DESCRIPTOR.fields_by_name:
+            state.chat_input_value.data = prompt
+        else:  # Streamlit releases before chat inputs accepted files
+            state.string_trigger_value.data = prompt
+        return await self.rerun(state)
+
+    async def click(self, label: str) -> RunResult:
+        return await self.rerun(WidgetState(id=self.buttons[label], trigger_value=True))
+
+    async def upload(self, filename: str, data: bytes) -> RunResult:
+        """Upload a file the way the browser does, then rerun with it attached."""
+        request_id = uuid.uuid4().hex
+        back_msg = BackMsg(
+            file_urls_request=FileURLsRequest(
+                request_id=request_id, file_names=[filename], session_id=self.session_id
+            )
+        )
+        started = time.perf_counter()
+        await self._send(back_msg)
+        while True:
+            message = await self._receive()
+            if (
+                message.WhichOneof("type") == "file_urls_response"
+                and message.file_urls_response.response_id == request_id
+            ):
+                break
+        file_urls = message.file_urls_response.file_urls[0]
+        await asyncio.to_thread(self._put_file, file_urls.upload_url, filename, data)
+
+        state = WidgetState(id=self.file_uploader_id)
+        info = state.file_uploader_state_value.uploaded_file_info.add()
+        info.name = filename
+        info.size = len(data)
+        info.file_id = file_urls.file_id
+        info.file_urls.CopyFrom(file_urls)
+        self.persistent_states[self.file_uploader_id] = state
+        result = await self.rerun()
+        result.seconds = time.perf_counter() - started
+        return result
+
+    def _put_file(self, url: str, filename: str, data: bytes) -> None:
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            "Content-Type: application/pdf\r\n\r\n"
+        ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            connection.request(
+                "PUT",
+                url,
+                body,
+                {"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            )
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 300:
+                raise ConnectionError(f"Upload failed with HTTP {response.status}")
+        finally:
+            connection.close()
+
+    def download(self, url: str) -> int:
+        with urllib.request.urlopen(
+            f"http://{self.host}:{self.port}{url}", timeout=60
+        ) as response:
+            return len(response.read())
+
+
+# --- scenario ---------------------------------------------------------------
+
+
+class LoadMetrics:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {
+            "time_to_first_token": [],
+            "response": [],
+            "rerun": [],
+            "upload": [],
+            "pdf_export": [],
+        }
+        self.responses = 0
+        self.response_chars = 0
+        self.completed_sessions = 0
+        self.failed_sessions = 0
+        self.errors: List[str] = []
+
+
+async def run_session(
+    index: int,
+    args: argparse.Namespace,
+    upload_data: Optional[bytes],
+    metrics: LoadMetrics,
+) -> None:
+    await asyncio.sleep(index * args.ramp_up / max(args.sessions, 1))
+    session = BrowserSession(args.host, args.port, args.response_marker)
+    try:
+        await session.connect()
+        metrics.samples["rerun"].append((await session.rerun()).seconds)
+
+        if upload_data is not None:
+            if args.distinct_uploads:
+                # Bytes after %%EOF are ignored by PDF readers but change the hash.
+                upload_data += f"\n% session {index}\n".encode()
+            result = await session.upload(f"dokument_{index}.pdf", upload_data)
+            metrics.samples["upload"].append(result.seconds)
+
+        prompts = [INITIAL_PROMPT] + [
+            f"Dodatno pitanje {number + 1}: koje su prioritetne mjere?"
+            for number in range(args.follow_ups)
+        ]
+        for prompt in prompts:
+            result = await session.ask(prompt)
+            metrics.errors += result.errors
+            if result.first_response_seconds is None:
+                raise RuntimeError(f"No response to {prompt!r}: {result.errors}")
+            metrics.samples["time_to_first_token"].append(result.first_response_seconds)
+            metrics.samples["response"].append(result.seconds)
+            metrics.responses += 1
+            metrics.response_chars += result.response_chars
+
+            await asyncio.sleep(args.think_time)
+            # Any widget interaction reruns the whole script.
+            metrics.samples["rerun"].append((await session.rerun()).seconds)
+
+        if not args.no_pdf:
+            started = time.perf_counter()
+            result = await session.click(PDF_BUTTON_LABEL)
+            metrics.errors += result.errors
+            url = next(iter(session.download_urls.values()), None)
+            if url is None:
+                raise RuntimeError("PDF export produced no download button")
+            await asyncio.to_thread(session.download, url)
+            metrics.samples["pdf_export"].append(time.perf_counter() - started)
+
+        metrics.completed_sessions += 1
+    except Exception as exc:
+        metrics.failed_sessions += 1
+        metrics.errors.append(f"session {index}: {type(exc).__name__}: {exc}")
+    finally:
+        await session.close()
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def _sample_rss(pid: int, samples: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        rss = _rss_mb(pid)
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile, or None without values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))]
+
+
+async def run_load(args: argparse.Namespace, server_pid: int, upload_data) -> Dict:
+    metrics = LoadMetrics()
+    rss_samples: List[float] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_rss(server_pid, rss_samples, stop))
+
+    started = time.perf_counter()
+    await asyncio.wait_for(
+        asyncio.gather(
+            *(
+                run_session(index, args, upload_data, metrics)
+                for index in range(args.sessions)
+            )
+        ),
+        args.timeout,
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    report = {
+        "sessions": args.sessions,
+        "completed_sessions": metrics.completed_sessions,
+        "failed_sessions": metrics.failed_sessions,
+        "elapsed_s": round(elapsed, 3),
+        "responses": metrics.responses,
+        "responses_per_s": round(metrics.responses / elapsed, 3),
+        "streamed_chars_per_s": round(metrics.response_chars / elapsed, 1),
+        "server_rss_mb": {
+            "start": round(rss_samples[0], 1) if rss_samples else None,
+            "peak": round(max(rss_samples), 1) if rss_samples else None,
+            "end": round(rss_samples[-1], 1) if rss_samples else None,
+        },
+        "latency_s": {
+            name: {
+                "count": len(values),
+                "p50": _rounded(percentile(values, 0.5)),
+                "p95": _rounded(percentile(values, 0.95)),
+                "max": _rounded(max(values) if values else None),
+            }
+            for name, values in metrics.samples.items()
+        },
+        "errors": metrics.errors[:20],
+    }
+    return report
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_app(args: argparse.Namespace, base_url: str, workdir: Path) -> subprocess.Popen:
+    """Start ``streamlit run app.py`` against the fake API and wait until healthy."""
+    secrets_path = workdir / "secrets.toml"
+    secrets_path.write_text('OPENAI_API_KEY = "load-test"\n', encoding="utf-8")
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY="load-test")
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "streamlit",
+            "run",
+            str(REPO_DIR / "app.py"),
+            "--server.headless=true",
+            f"--server.port={args.port}",
+            "--server.address=127.0.0.1",
+            "--server.enableXsrfProtection=false",
+            "--server.enableCORS=false",
+            "--server.fileWatcherType=none",
+            "--browser.gatherUsageStats=false",
+            f"--secrets.files={secrets_path}",
+        ],
+        cwd=REPO_DIR,
+        env=env,
+        stdout=open(workdir / "server.log", "w", encoding="utf-8"),
+        stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Streamlit exited; see {workdir / 'server.log'}")
+        try:
+            with urllib.request.urlopen(
+                f"http://{args.host}:{args.port}/_stcore/health", timeout=2
+            ):
+                return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Streamlit did not become healthy within 60 seconds")
+
+
+def print_report(report: Dict) -> None:
+    print(
+        f"Sessions: {report['completed_sessions']}/{report['sessions']} completed "
+        f"in {report['elapsed_s']:.1f}s"
+    )
+    print(
+        f"Throughput: {report['responses']} responses, "
+        f"{report['responses_per_s']:.2f} responses/s, "
+        f"{report['streamed_chars_per_s']:.0f} streamed chars/s"
+    )
+    for name, stats in report["latency_s"].items():
+        if stats["count"]:
+            print(
+                f"  {name:<20} n={stats['count']:<4} p50 {stats['p50']:.3f}s  "
+                f"p95 {stats['p95']:.3f}s  max {stats['max']:.3f}s"
+            )
+    rss = report["server_rss_mb"]
+    if rss["peak"] is not None:
+        print(
+            f"Server RSS: start {rss['start']:.0f} MB, peak {rss['peak']:.0f} MB, "
+            f"end {rss['end']:.0f} MB"
+        )
+    for error in report["errors"]:
+        print(f"  error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--follow-ups", type=int, default=2)
+    parser.add_argument(
+        "--ramp-up", type=float, default=5.0, help="seconds over which sessions start"
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=1.0, help="pause after each response"
+    )
+    parser.add_argument(
+        "--upload-pages", type=int, default=20, help="pages of the uploaded PDF; 0 skips"
+    )
+    parser.add_argument(
+        "--distinct-uploads",
+        action="store_true",
+        help="give every session a different document instead of the same one",
+    )
+    parser.add_argument("--no-pdf", action="store_true", help="skip the PDF export")
+    parser.add_argument("--first-token-delay", type=float, default=1.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--chunk-chars", type=int, default=16)
+    parser.add_argument(
+        "--response-chars", type=int, default=2000, help="length of every fake answer"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="app port (default: free)")
+    parser.add_argument("--timeout", type=float, default=900)
+    parser.add_argument("-o", "--output", help="also write the report as JSON")
+    args = parser.parse_args()
+    args.port = args.port or _free_port()
+
+    text = (DEFAULT_TEXT * (args.response_chars // len(DEFAULT_TEXT) + 1))[
+        : args.response_chars
+    ]
+    # The first streamed chunk of every answer; marks time to first token.
+    args.response_marker = text[: min(12, args.chunk_chars)]
+    _, base_url = serve_in_thread(
+        FakeResponsesConfig(
+            text=text,
+            chunk_chars=args.chunk_chars,
+            first_token_delay=args.first_token_delay,
+            chunk_delay=args.chunk_delay,
+        )
+    )
+
+    upload_data = None
+    if args.upload_pages:
+        upload_data = generate_pdf(DATA_DIR, args.upload_pages).read_bytes()
+
+    with tempfile.TemporaryDirectory(prefix="load-test-") as workdir:
+        process = start_app(args, base_url, Path(workdir))
+        try:
+            report = asyncio.run(run_load(args, process.pid, upload_data))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8"
+        )
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
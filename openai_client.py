@@ -0,0 +1,144 @@
+"""Process-wide OpenAI client with timeouts and retries before the first token.
+
+All requests share one client, and so one HTTP connection pool, instead of
+paying connection and TLS setup per call. The SDK's own retries are disabled:
+``create_response_stream`` retries rate-limit, server and connection errors
+with exponential backoff until the first output token arrives, after which
+an error is passed on, since the user has already seen part of the answer.
+
+Setting ``OPENAI_BASE_URL`` (for example to ``fake_openai_server.py``) points
+the whole path at another endpoint.
+"""
+
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Iterator, Optional
+
+from openai import (
+    APIConnectionError,
+    APIError,
+    APITimeoutError,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+    Timeout,
+)
+
+logger = logging.getLogger(__name__)
+
+OPENAI_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_TIMEOUT_SECONDS", "300"))
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get("OPENAI_CONNECT_TIMEOUT_SECONDS", "10")
+)
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "4"))
+OPENAI_RETRY_BASE_SECONDS = float(os.environ.get("OPENAI_RETRY_BASE_SECONDS", "1"))
+OPENAI_RETRY_MAX_SECONDS = 30.0
+
+RETRYABLE_ERRORS = (
+    RateLimitError,
+    InternalServerError,
+    APIConnectionError,
+    APITimeoutError,
+)
+# Error codes of ``error`` events sent inside an already accepted stream.
+RETRYABLE_STREAM_ERROR_CODES = {"rate_limit_exceeded", "server_error"}
+
+_client: Optional[OpenAI] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenAI:
+    """Return the shared client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(
+                timeout=Timeout(
+                    OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS
+                ),
+                max_retries=0,
+            )
+            logger.info("Created shared OpenAI client for %s", _client.base_url)
+        return _client
+
+
+def _backoff_seconds(attempt: int, error: Exception) -> float:
+    """Exponential backoff with jitter, honouring a server ``Retry-After``."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), OPENAI_RETRY_MAX_SECONDS)
+        except ValueError:
+            pass
+    delay = OPENAI_RETRY_BASE_SECONDS * 2**attempt
+    return min(delay * random.uniform(0.5, 1.0), OPENAI_RETRY_MAX_SECONDS)
+
+
+def _is_retryable(error: Exception) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS) or (
+        isinstance(error, APIError)
+        and getattr(error, "code", None) in RETRYABLE_STREAM_ERROR_CODES
+    )
+
+
+def _retry_or_raise(attempt: int, error: Exception) -> None:
+    """Sleep before the next attempt, or re-raise once retries are exhausted."""
+    if not _is_retryable(error) or attempt >= OPENAI_MAX_RETRIES:
+        raise error
+    delay = _backoff_seconds(attempt, error)
+    logger.warning(
+        "OpenAI request failed (%s), retry %d/%d in %.1fs",
+        error.__class__.__name__,
+        attempt + 1,
+        OPENAI_MAX_RETRIES,
+        delay,
+    )
+    time.sleep(delay)
+
+
+def _is_output_event(event) -> bool:
+    return bool(getattr(event, "delta", None) or getattr(event, "content", None))
+
+
+def create_response(**request):
+    """Create a non-streaming response, retrying transient errors."""
+    for attempt in itertools.count():
+        try:
+            return get_client().responses.create(**request)
+        except APIError as exc:
+            _retry_or_raise(attempt, exc)
+
+
+def create_response_stream(**request) -> Iterator:
+    """Open a response stream, retrying until its first output token.
+
+    The stream is read eagerly up to the first text delta so that failures
+    surfacing only after the request was accepted are retried as well.
+    Non-retryable errors (e.g. an expired ``previous_response_id``) are
+    raised immediately, as ``responses.create`` would.
+    """
+    request = {**request, "stream": True}
+    for attempt in itertools.count():
+        buffered = []
+        stream = None
+        try:
+            stream = get_client().responses.create(**request)
+            events = iter(stream)
+            for event in events:
+                buffered.append(event)
+                if _is_output_event(event):
+                    break
+        except BaseException as exc:
+            # Release the failed stream's connection before retrying or raising.
+            if stream is not None:
+                stream.close()
+            if not isinstance(exc, APIError):
+                raise
+            _retry_or_raise(attempt, exc)
+            continue
+        return itertools.chain(buffered, events)
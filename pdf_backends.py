@@ -0,0 +1,149 @@
+"""Interchangeable PDF text extraction engines with per-page timing."""
+
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+
+import pdfplumber
+import pypdfium2 as pdfium
+
+logger = logging.getLogger(__name__)
+
+# Engine used for every page; pages it returns no text for fall back to pdfplumber.
+PDF_TEXT_BACKEND = os.environ.get("PDF_TEXT_BACKEND", "pdfium")
+
+# PDFium is not thread-safe, so all calls into it within a process are serialised.
+_PDFIUM_LOCK = threading.Lock()
+
+OpenTarget = Union[str, bytes]
+PageTiming = Tuple[int, str, float]
+
+
+def page_count(open_target: OpenTarget) -> int:
+    """Return the number of pages in a PDF path or byte string."""
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(open_target)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+
+def _extract_pages_pdfium(open_target: OpenTarget, pages: List[int]) -> List[str]:
+    texts = []
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(open_target)
+        try:
+            for index in pages:
+                page = pdf[index]
+                textpage = page.get_textpage()
+                texts.append(textpage.get_text_range().replace("\r\n", "\n"))
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+    return texts
+
+
+def _extract_pages_pdfplumber(
+    open_target: OpenTarget, pages: List[int]
+) -> List[str]:
+    if isinstance(open_target, bytes):
+        open_target = io.BytesIO(open_target)
+
+    with pdfplumber.open(open_target, pages=[index + 1 for index in pages]) as pdf:
+        return [
+            page.extract_text() or ""  # Handle cases where extract_text() returns None
+            for page in pdf.pages
+        ]
+
+
+BACKENDS: Dict[str, Callable[[OpenTarget, List[int]], List[str]]] = {
+    "pdfium": _extract_pages_pdfium,
+    "pdfplumber": _extract_pages_pdfplumber,
+}
+
+
+def extract_pages_timed(
+    open_target: OpenTarget,
+    start: int,
+    stop: int,
+    backend: str = PDF_TEXT_BACKEND,
+) -> Tuple[List[str], List[PageTiming]]:
+    """Return page texts for ``start:stop`` and ``(page, engine, seconds)`` timings.
+
+    Pages for which ``backend`` yields only whitespace are re-extracted with
+    pdfplumber, and both attempts are recorded in the timings.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF text backend: {backend}")
+
+    extract_pages = BACKENDS[backend]
+    texts: List[str] = []
+    timings: List[PageTiming] = []
+    for index in range(start, stop):
+        started = time.perf_counter()
+        text = extract_pages(open_target, [index])[0]
+        timings.append((index, backend, time.perf_counter() - started))
+
+        if not text.strip() and backend != "pdfplumber":
+            started = time.perf_counter()
+            text = _extract_pages_pdfplumber(open_target, [index])[0]
+            timings.append((index, "pdfplumber", time.perf_counter() - started))
+
+        texts.append(text)
+
+    return texts, timings
+
+
+def extract_pages(
+    open_target: OpenTarget,
+    start: int,
+    stop: int,
+    backend: str = PDF_TEXT_BACKEND,
+) -> List[str]:
+    """Return page texts for ``start:stop`` using ``backend`` with pdfplumber fallback."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF text backend: {backend}")
+
+    texts = BACKENDS[backend](open_target, list(range(start, stop)))
+    if backend == "pdfplumber":
+        return texts
+
+    empty_pages = [start + i for i, text in enumerate(texts) if not text.strip()]
+    if empty_pages:
+        logger.info("Falling back to pdfplumber for %d empty pages", len(empty_pages))
+        for index, text in zip(
+            empty_pages, _extract_pages_pdfplumber(open_target, empty_pages)
+        ):
+            texts[index - start] = text
+
+    return texts
+
+
+def compare_backends(pdf_path: Path) -> None:
+    """Print per-page and total extraction times of every engine for a PDF."""
+    open_target = str(pdf_path)
+    pages = page_count(open_target)
+    print(f"{pdf_path}: {pages} pages")
+
+    for backend in BACKENDS:
+        texts, timings = extract_pages_timed(open_target, 0, pages, backend)
+        for index, engine, seconds in timings:
+            print(f"  {backend:<10} page {index + 1:>4} {engine:<10} {seconds * 1000:8.1f} ms")
+        total = sum(seconds for _, _, seconds in timings)
+        fallbacks = sum(1 for _, engine, _ in timings if engine != backend)
+        print(
+            f"{backend}: {total:.2f} s total, {sum(map(len, texts))} characters, "
+            f"{fallbacks} pages fell back to pdfplumber"
+        )
+
+
+if __name__ == "__main__":
+    for arg in sys.argv[1:]:
+        compare_backends(Path(arg))
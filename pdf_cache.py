@@ -0,0 +1,116 @@
+"""On-disk, content-addressed cache for text extracted from PDF documents."""
+
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Union
+
+from pdf_backends import PDF_TEXT_BACKEND
+from telemetry import configure_logging, span
+from utils import extract_text_from_pdf
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the extraction output changes so stale entries are never served.
+EXTRACTOR_VERSION = f"{PDF_TEXT_BACKEND}-1"
+
+CACHE_DIR = Path(os.environ.get("PDF_TEXT_CACHE_DIR", ".cache/pdf_text"))
+CACHE_MAX_BYTES = int(os.environ.get("PDF_TEXT_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(pdf_source: Union[str, Path, BinaryIO]) -> str:
+    """Return the SHA-256 hex digest of a PDF path or binary stream."""
+    digest = hashlib.sha256()
+
+    if isinstance(pdf_source, (str, Path)):
+        with open(pdf_source, "rb") as pdf_file:
+            while chunk := pdf_file.read(_HASH_CHUNK_SIZE):
+                digest.update(chunk)
+    else:
+        pdf_source.seek(0)
+        while chunk := pdf_source.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        pdf_source.seek(0)
+
+    return digest.hexdigest()
+
+
+def _cache_path(content_hash: str) -> Path:
+    return CACHE_DIR / f"{content_hash}-{EXTRACTOR_VERSION}.txt"
+
+
+def _evict_if_needed() -> None:
+    """Remove least recently used entries until the cache fits its size cap."""
+    entries = []
+    total_size = 0
+    for entry in CACHE_DIR.glob("*.txt"):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+        total_size += stat.st_size
+
+    if total_size <= CACHE_MAX_BYTES:
+        return
+
+    for _, size, entry in sorted(entries):
+        try:
+            entry.unlink()
+        except FileNotFoundError:
+            pass
+        logger.info("Evicted cached PDF text: %s", entry.name)
+        total_size -= size
+        if total_size <= CACHE_MAX_BYTES:
+            break
+
+
+def extract_text_cached(pdf_source: Union[str, Path, BinaryIO]) -> str:
+    """Return PDF text, parsing the document only when it is not cached yet."""
+    source_hash = content_hash(pdf_source)
+    cache_path = _cache_path(source_hash)
+
+    try:
+        with span("pdf_text_cache_read"):
+            text = cache_path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        pass
+    else:
+        # Touching the entry keeps the mtime usable as the LRU timestamp.
+        os.utime(cache_path)
+        logger.debug("PDF text cache hit: %s", source_hash[:12])
+        return text
+
+    logger.debug("PDF text cache miss: %s", source_hash[:12])
+    text = extract_text_from_pdf(pdf_source)
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so concurrent readers never see partial text.
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=CACHE_DIR, suffix=".tmp", delete=False
+    ) as tmp_file:
+        tmp_file.write(text)
+    os.replace(tmp_file.name, cache_path)
+
+    _evict_if_needed()
+    return text
+
+
+def warm_cache(paths: list[Path]) -> None:
+    """Extract and cache every given PDF ahead of the first analysis request."""
+    for path in paths:
+        text = extract_text_cached(path)
+        print(f"Cached {path} ({len(text)} characters)")
+
+
+if __name__ == "__main__":
+    configure_logging()
+    targets = [Path(arg) for arg in sys.argv[1:]] or sorted(
+        Path("assets").rglob("*.pdf")
+    )
+    warm_cache(targets)
@@ -0,0 +1,111 @@
+"""Token-budgeted assembly of prompt sections with a per-section report."""
+
+import math
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "100000"))
+
+TRIM_MARKER = "\n[... skraćeno zbog ograničenja duljine ...]\n\n"
+
+# Rough bytes-per-token ratio for GPT tokenizers on mixed Croatian/English
+# text; UTF-8 bytes make diacritics count extra, as they do for the tokenizer.
+_BYTES_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Return a local, dependency-free estimate of the token count of ``text``."""
+    return math.ceil(len(text.encode("utf-8")) / _BYTES_PER_TOKEN)
+
+
+@dataclass
+class PromptSection:
+    """One named part of the prompt; lower ``priority`` is trimmed first.
+
+    Sections with ``trimmable`` unset are always kept whole, even when that
+    leaves the prompt over budget.
+    """
+
+    name: str
+    text: str
+    priority: int
+    trimmable: bool = True
+
+
+def _trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest line-aligned prefix of ``text`` within ``max_tokens``."""
+    available = max_tokens - estimate_tokens(TRIM_MARKER)
+    if available <= 0:
+        return ""
+
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= available:
+            low = middle
+        else:
+            high = middle - 1
+
+    cut = text.rfind("\n", 0, low)
+    if cut <= 0:
+        return ""
+    return text[:cut] + TRIM_MARKER
+
+
+def assemble_prompt(
+    sections: List[PromptSection], budget: int = PROMPT_TOKEN_BUDGET
+) -> Tuple[str, Dict]:
+    """Join ``sections`` in order, trimming low-priority ones to fit ``budget``.
+
+    Trimmable sections are cut from the end, lowest priority first (ties
+    broken by later position), until the estimate fits; a section that cannot
+    keep a single line is dropped. The report lists estimated tokens per
+    section before and after trimming and the characters each section kept.
+    """
+    texts = [section.text for section in sections]
+    tokens = [estimate_tokens(text) for text in texts]
+    total = sum(tokens)
+
+    trim_order = sorted(
+        (index for index, section in enumerate(sections) if section.trimmable),
+        key=lambda index: (sections[index].priority, -index),
+    )
+    for index in trim_order:
+        if total <= budget:
+            break
+        excess = total - budget
+        trimmed = _trim_to_tokens(texts[index], tokens[index] - excess)
+        total += estimate_tokens(trimmed) - tokens[index]
+        texts[index] = trimmed
+        tokens[index] = estimate_tokens(trimmed)
+
+    report = {
+        "budget": budget,
+        "total_tokens": total,
+        "within_budget": total <= budget,
+        "sections": [
+            {
+                "name": section.name,
+                "priority": section.priority,
+                "tokens": estimate_tokens(section.text),
+                "kept_tokens": kept,
+                "chars": len(text),
+                "trimmed": text != section.text,
+            }
+            for section, text, kept in zip(sections, texts, tokens)
+        ],
+    }
+    return "".join(texts), report
+
+
+def format_report(report: Dict) -> str:
+    """Render an ``assemble_prompt`` report as a small fixed-width table."""
+    lines = [f"Prompt tokens (estimated): {report['total_tokens']} / {report['budget']}"]
+    for section in report["sections"]:
+        marker = " (trimmed)" if section["trimmed"] else ""
+        lines.append(
+            f"  {section['name']:<12} {section['kept_tokens']:>8} / "
+            f"{section['tokens']:>8}{marker}"
+        )
+    return "\n".join(lines)
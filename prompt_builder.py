@@ -1,12 +1,23 @@
 """Utilities for preparing the analysis prompt sent to the OpenAI API."""
 
-import json
+import logging
+import os
 from pathlib import Path
 from typing import Dict, List, Tuple
 
-from utils import calculate_averages, extract_text_from_pdf
+from institution_index import institution_averages, list_institutions, national_averages
+from pdf_cache import extract_text_cached
+from prompt_budget import (
+    PROMPT_TOKEN_BUDGET,
+    PromptSection,
+    assemble_prompt,
+    format_report,
+)
+from retrieval import retrieve_domain_passages
+from survey_store import CATEGORIES
+from telemetry import span
 
-CATEGORIES = ["it_strucnjaci", "nastavnici", "studenti", "uprava"]
+logger = logging.getLogger(__name__)
 
 HELSINKI_DOCS = [
     ("helsinki_strategy.pdf", "Helsinki Strategy Document"),
@@ -18,10 +29,61 @@ TARTU_DOCS = [
     ("tartu_action_plan.pdf", "Tartu Action Plan Document"),
 ]
 
+STRATEGY_TITLE = "Strategija razvoja Sveučilišta Jurja Dobrile u Puli 2021. - 2026"
+USER_PDF_LABEL = "[USER PDF]"
+
+# Send only the top-ranked passages per analysis domain instead of whole documents.
+USE_RETRIEVAL = os.environ.get("PROMPT_RETRIEVAL", "1") == "1"
+
+# Prompt sections in output order with their trim priority (lower is trimmed first).
+# Static material comes first and the per-request user context last, so requests
+# with the same documents and toggles share a prefix the provider can cache.
+SECTION_PRIORITIES = {
+    "strategy": 60,
+    "user_docs": 50,
+    "comparison": 40,
+    "survey": 80,
+    "instructions": 100,
+    "context": 90,
+}
+# The survey results, the user's own context and the task instructions are
+# never trimmed; only document excerpts give way to the token budget.
+UNTRIMMABLE_SECTIONS = {"survey", "context", "instructions"}
+
+RETRIEVED_HEADERS = {
+    "strategy": "Relevantni izvodi iz strategije učilišta po područjima analize:\n\n",
+    "user_docs": (
+        "Relevantni izvodi iz korisnički učitanih dokumenata "
+        "(označeno kao [USER PDF]) po područjima analize:\n\n"
+    ),
+    "comparison": (
+        "Relevantni izvodi iz strateških dokumenata drugih sveučilišta "
+        "po područjima analize:\n\n"
+    ),
+}
+
+# Survey Institution_ID (VU_ID) -> (full name, abbreviation)
+INSTITUTIONS = {
+    20: ("Sveučilište Jurja Dobrile u Puli", "UNIPU"),
+}
+DEFAULT_INSTITUTION_ID = 20
+
+
+def institution_name(institution_id: int) -> Tuple[str, str]:
+    """Return the full name and abbreviation used for an institution in prompts."""
+    return INSTITUTIONS.get(
+        institution_id, (f"Visoko učilište {institution_id}", f"VU {institution_id}")
+    )
+
 
-def get_task_instructions(include_helsinki: bool, include_tartu: bool) -> str:
+def get_task_instructions(
+    include_helsinki: bool,
+    include_tartu: bool,
+    institution_id: int = DEFAULT_INSTITUTION_ID,
+) -> str:
     """Return base instructions with optional comparative analysis guidance."""
-    base_instructions = """Visoko učilište: Sveučilište Jurja Dobrile u Puli (UNIPU)
+    name, abbreviation = institution_name(institution_id)
+    base_instructions = f"""Visoko učilište: {name} ({abbreviation})
 
 Na temelju ispunjenih upitnika i dostupnih informacija o visokom učilištu, napišite strukturirani izvještaj analize i preporuka za digitalnu transformaciju tog učilišta.
 
@@ -46,11 +108,11 @@ VAŽNO:
 - Prilikom korištenja skraćenica, prvo navedi puni naziv, a zatim skraćenicu u zagradama, npr. Sveučilište Jurja Dobrile u Puli (UNIPU)."""
 
     if include_helsinki or include_tartu:
-        base_instructions += """
+        base_instructions += f"""
 
 DODATNE UPUTE ZA KOMPARATIVNU ANALIZU:
-- Analizirajte i usporedite strateške pristupe UNIPU-a s pristupima drugih sveučilišta.
-- Identificirajte najbolje prakse iz strategija drugih sveučilišta koje bi mogle biti primjenjive na UNIPU.
+- Analizirajte i usporedite strateške pristupe {abbreviation}-a s pristupima drugih sveučilišta.
+- Identificirajte najbolje prakse iz strategija drugih sveučilišta koje bi mogle biti primjenjive na {abbreviation}.
 - U preporukama eksplicitno navedite primjere iz strategija drugih sveučilišta kada su relevantni.
 - Koristite fraze poput "Prema iskustvu Sveučilišta Helsinki..." ili "Sveučilište Tartu je uspješno implementiralo..." kada citirate najbolje prakse.
 - Fokusirajte se na praktične i izvodljive prijedloge temeljene na dokazanim uspješnim pristupima."""
@@ -58,121 +120,238 @@ DODATNE UPUTE ZA KOMPARATIVNU ANALIZU:
     return base_instructions
 
 
-def _ensure_survey_averages() -> Dict[str, Dict[str, Dict[str, float]]]:
-    """Recalculate survey averages and return their JSON payloads."""
-    averages_dir = Path("averages")
-    averages_dir.mkdir(parents=True, exist_ok=True)
-
-    results: Dict[str, Dict[str, Dict[str, float]]] = {}
-    for category in CATEGORIES:
-        json_path = Path("json_data") / f"{category}.json"
-        data = calculate_averages(json_path)
-        output_path = averages_dir / f"{category}_data.json"
-        with output_path.open("w", encoding="utf-8") as json_file:
-            json.dump(data, json_file, ensure_ascii=False, indent=2)
-        results[category] = data
-
-    return results
-
-
-def _append_document_texts(prompt: str, documents: list[tuple[str, str]]) -> str:
-    """Concatenate document texts into the prompt if the files exist."""
+def _load_document_texts(
+    documents: list[tuple[str, str]], subfolder: str = ""
+) -> list[tuple[str, str]]:
+    """Return ``(title, text)`` for each asset document that exists."""
+    loaded = []
     for filename, title in documents:
-        doc_path = Path("assets") / Path(filename)
+        doc_path = Path("assets") / subfolder / filename
         if not doc_path.exists():
-            print(f"Warning: {doc_path} not found")
+            logger.warning("%s not found", doc_path)
             continue
 
-        doc_text = extract_text_from_pdf(doc_path)
-        prompt += f"{title}:\n{doc_text}\n\n"
-        print(f"Added {title}")
-
-    return prompt
+        loaded.append((title, extract_text_cached(doc_path)))
+        logger.debug("Added %s", title)
 
+    return loaded
 
-def _append_nested_document_texts(
-    prompt: str, documents: list[tuple[str, str]], subfolder: str
-) -> str:
-    """Helper for Helsinki/Tartu docs that live inside a subfolder."""
-    resolved = []
-    for filename, title in documents:
-        resolved.append((str(Path(subfolder) / filename), title))
-    return _append_document_texts(prompt, resolved)
 
-
-def build_analysis_prompt(
-    user_context: str,
+def _collect_documents(
     include_pdf: bool,
     include_helsinki: bool,
     include_tartu: bool,
-    uploaded_documents: List[Tuple[str, str]] | None = None,
-) -> str:
-    """Compose the full prompt for the initial analysis call."""
-    print(
-        "Building analysis prompt. "
-        f"Include PDF: {include_pdf}, Include Helsinki: {include_helsinki}, Include Tartu: {include_tartu}"
-    )
-    print(f"User context: {user_context}")
-
-    survey_averages = _ensure_survey_averages()
-    print("Averages calculated successfully")
-
-    prompt = ""
-
-    user_docs = uploaded_documents or []
+    user_docs: List[Tuple[str, str]],
+) -> Dict[str, list[tuple[str, str]]]:
+    """Return ``(title, text)`` pairs per document section for the prompt."""
+    documents: Dict[str, list[tuple[str, str]]] = {
+        "strategy": [],
+        "user_docs": [],
+        "comparison": [],
+    }
 
     if include_pdf:
-        print("Including PDF content...")
-        pdf_path = Path("assets") / "strategija_razvoja.pdf"
-        pdf_text = extract_text_from_pdf(pdf_path)
-        prompt += (
-            "Strategija razvoja Sveučilišta Jurja Dobrile u Puli 2021. - 2026:\n"
-            f"{pdf_text}\n\n"
+        logger.debug("Including PDF content...")
+        documents["strategy"] += _load_document_texts(
+            [("strategija_razvoja.pdf", STRATEGY_TITLE)]
         )
-        print("PDF content added successfully")
     else:
-        print("Skipping PDF content")
+        logger.debug("Skipping PDF content")
 
     if user_docs:
-        print(f"Including {len(user_docs)} user-uploaded documents")
-        prompt += "Korisnički učitani dokumenti (označeno kao [USER PDF]):\n"
+        logger.debug("Including %d user-uploaded documents", len(user_docs))
         for filename, text in user_docs:
             trimmed_text = text.strip()
             if not trimmed_text:
-                print(f"Skipping empty user document: {filename}")
+                logger.warning("Skipping empty user document: %s", filename)
                 continue
-            print(
-                f"Adding user document: {filename} with {len(trimmed_text)} characters"
+            logger.debug(
+                "Adding user document: %s with %d characters",
+                filename,
+                len(trimmed_text),
             )
-            prompt += f"[USER PDF] {filename}:\n{trimmed_text}\n\n"
+            documents["user_docs"].append((f"{USER_PDF_LABEL} {filename}", trimmed_text))
 
     if include_helsinki:
-        print("Including Helsinki documents...")
-        prompt = _append_nested_document_texts(prompt, HELSINKI_DOCS, "Helsinki")
+        logger.debug("Including Helsinki documents...")
+        documents["comparison"] += _load_document_texts(HELSINKI_DOCS, "Helsinki")
 
     if include_tartu:
-        print("Including Tartu documents...")
-        prompt = _append_nested_document_texts(prompt, TARTU_DOCS, "Tartu")
+        logger.debug("Including Tartu documents...")
+        documents["comparison"] += _load_document_texts(TARTU_DOCS, "Tartu")
+
+    return documents
+
+
+def _format_full_documents(section_name: str, documents: list[tuple[str, str]]) -> str:
+    """Render the complete text of every document in one section."""
+    if not documents:
+        return ""
+
+    section = ""
+    if section_name == "user_docs":
+        section += "Korisnički učitani dokumenti (označeno kao [USER PDF]):\n"
+    for title, text in documents:
+        section += f"{title}:\n{text}\n\n"
+    return section
+
+
+def _format_retrieved_passages(
+    section_name: str,
+    documents: list[tuple[str, str]],
+    retrieved: list[tuple[str, list[tuple[str, str]]]],
+) -> str:
+    """Render the retrieved passages that come from one section's documents."""
+    titles = {title for title, _ in documents}
+    section = ""
+    for domain, passages in retrieved:
+        passages = [(title, text) for title, text in passages if title in titles]
+        if not passages:
+            continue
+        section += f"{domain}:\n"
+        for title, passage in passages:
+            section += f"Izvor: {title}\n{passage}\n\n"
+
+    return RETRIEVED_HEADERS[section_name] + section if section else ""
 
-    prompt += "Prosječne ocjene iz upitnika:\n"
 
-    for category, data in survey_averages.items():
-        print(f"Processing category: {category}")
-        prompt += f"{category}:\n"
+def _format_survey_block(institution_id: int) -> str:
+    """Render the institution's survey averages, with national baselines if any."""
+    section = "Prosječne ocjene iz upitnika:\n"
+
+    # National baselines only add information once several institutions are loaded.
+    include_baseline = len(list_institutions()) > 1
+
+    for category in CATEGORIES:
+        data = institution_averages(category, institution_id)
+        if data is None:
+            logger.info(
+                "No survey data for institution %s in %s", institution_id, category
+            )
+            continue
+        baseline = national_averages(category) if include_baseline else None
+        logger.debug("Processing category: %s", category)
+        section += f"{category}:\n"
         for question_id, average in data["averages"].items():
             question_text = data["question_texts"][question_id]
-            prompt += (
-                f"{question_id}: {question_text} - Prosječna ocjena: {average:.2f}\n"
+            section += (
+                f"{question_id}: {question_text} - Prosječna ocjena: {average:.2f}"
             )
-        prompt += "\n"
+            if baseline is not None:
+                section += (
+                    f" (nacionalni prosjek: {baseline['averages'][question_id]:.2f})"
+                )
+            section += "\n"
+        section += "\n"
+
+    return section
+
+
+def assemble_analysis_prompt(
+    user_context: str,
+    include_pdf: bool,
+    include_helsinki: bool,
+    include_tartu: bool,
+    uploaded_documents: List[Tuple[str, str]] | None = None,
+    institution_id: int = DEFAULT_INSTITUTION_ID,
+    use_retrieval: bool | None = None,
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+) -> Tuple[str, Dict]:
+    """Compose the initial analysis prompt and its per-section token report.
+
+    With retrieval enabled (``PROMPT_RETRIEVAL``, on by default) only the
+    passages most relevant to each analysis domain are included instead of
+    the full text of every selected document. Sections are then fitted into
+    ``token_budget`` (``PROMPT_TOKEN_BUDGET``), trimming comparison documents
+    first, then uploads, then the strategy; see ``SECTION_PRIORITIES``. The
+    survey results, user context and instructions are always kept whole. The
+    report's ``static_prefix_chars`` marks where the user context begins.
+    """
+    logger.debug(
+        "Building analysis prompt. "
+        "Include PDF: %s, Include Helsinki: %s, Include Tartu: %s",
+        include_pdf,
+        include_helsinki,
+        include_tartu,
+    )
+    logger.debug("User context: %s", user_context)
 
+    user_docs = uploaded_documents or []
+    with span("prompt_documents") as stage:
+        documents = _collect_documents(
+            include_pdf, include_helsinki, include_tartu, user_docs
+        )
+        stage.set(documents=sum(len(docs) for docs in documents.values()))
+
+    if use_retrieval is None:
+        use_retrieval = USE_RETRIEVAL
+    texts: Dict[str, str] = {}
+    if use_retrieval:
+        all_documents = [doc for docs in documents.values() for doc in docs]
+        logger.debug(
+            "Retrieving relevant passages from %d documents", len(all_documents)
+        )
+        with span("prompt_retrieval"):
+            retrieved = retrieve_domain_passages(all_documents)
+        for name, docs in documents.items():
+            texts[name] = _format_retrieved_passages(name, docs, retrieved)
+    else:
+        for name, docs in documents.items():
+            texts[name] = _format_full_documents(name, docs)
+
+    with span("prompt_survey"):
+        texts["survey"] = _format_survey_block(institution_id)
+
+    texts["context"] = ""
     if user_context and user_context.strip():
         context = user_context.strip()
-        print(f"Adding user context: {context}")
-        prompt += f"Kontekst/upute korisnika:\n{context}\n\n"
+        logger.debug("Adding user context: %s", context)
+        texts["context"] = f"\n\nKontekst/upute korisnika:\n{context}"
     else:
-        print("No user context provided - proceeding with standard analysis")
+        logger.debug("No user context provided - proceeding with standard analysis")
+
+    texts["instructions"] = get_task_instructions(
+        include_helsinki, include_tartu, institution_id
+    )
 
-    prompt += get_task_instructions(include_helsinki, include_tartu)
-    print(f"Final prompt built with length: {len(prompt)} characters")
+    with span("prompt_budget"):
+        prompt, report = assemble_prompt(
+            [
+                PromptSection(
+                    name, texts[name], priority, name not in UNTRIMMABLE_SECTIONS
+                )
+                for name, priority in SECTION_PRIORITIES.items()
+            ],
+            token_budget,
+        )
+    # Everything before the user context is identical across such requests.
+    section_chars = [section["chars"] for section in report["sections"]]
+    context_position = list(SECTION_PRIORITIES).index("context")
+    report["static_prefix_chars"] = sum(section_chars[:context_position])
+    logger.info(format_report(report))
+    logger.debug("Final prompt built with length: %d characters", len(prompt))
+    return prompt, report
+
+
+def build_analysis_prompt(
+    user_context: str,
+    include_pdf: bool,
+    include_helsinki: bool,
+    include_tartu: bool,
+    uploaded_documents: List[Tuple[str, str]] | None = None,
+    institution_id: int = DEFAULT_INSTITUTION_ID,
+    use_retrieval: bool | None = None,
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+) -> str:
+    """Compose the full prompt for the initial analysis call."""
+    prompt, _ = assemble_analysis_prompt(
+        user_context,
+        include_pdf,
+        include_helsinki,
+        include_tartu,
+        uploaded_documents,
+        institution_id,
+        use_retrieval,
+        token_budget,
+    )
     return prompt
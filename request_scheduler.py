@@ -0,0 +1,180 @@
+"""Process-wide limit on concurrent model requests, shared fairly by sessions.
+
+Every Streamlit session runs in the same process, so one scheduler caps how
+many requests are in flight at once. Waiting requests are served round-robin
+by session: a session that was just served goes to the back, so one user
+sending several questions cannot starve the rest of a workshop. Requests are
+rejected when the queue is full or they waited longer than the timeout.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from telemetry import register_gauges, span
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", "4"))
+MAX_QUEUED_REQUESTS = int(os.environ.get("MAX_QUEUED_REQUESTS", "50"))
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get("QUEUE_TIMEOUT_SECONDS", "300"))
+
+PositionCallback = Callable[[int], None]
+
+
+class SchedulerRejectedError(RuntimeError):
+    """Raised when a request cannot be queued or waited too long."""
+
+
+class FairScheduler:
+    """Counting semaphore with per-session round-robin ordering of waiters."""
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+        max_queued: int = MAX_QUEUED_REQUESTS,
+        queue_timeout: float = QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._changed = threading.Condition()
+        self._running = 0
+        # session id -> waiting tickets; key order is the round-robin order.
+        self._queues: "OrderedDict[str, Deque[object]]" = OrderedDict()
+        self._admitted = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _service_order(self) -> List[object]:
+        """Waiting tickets in the order they will be admitted."""
+        queues = [list(queue) for queue in self._queues.values()]
+        order = []
+        for depth in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[depth] for queue in queues if depth < len(queue))
+        return order
+
+    def _remove(self, session_id: str, ticket: object) -> None:
+        queue = self._queues[session_id]
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[session_id]
+
+    def acquire(
+        self, session_id: str, on_position: Optional[PositionCallback] = None
+    ) -> float:
+        """Block until a slot is free for ``session_id``; return the wait in seconds.
+
+        ``on_position`` is called with the 1-based queue position whenever it
+        changes while waiting. Raises ``SchedulerRejectedError`` if the queue
+        is full or the request waited longer than ``queue_timeout``.
+        """
+        ticket = object()
+        started = time.monotonic()
+        with self._changed:
+            queued = sum(len(queue) for queue in self._queues.values())
+            if queued >= self.max_queued:
+                self._rejected += 1
+                raise SchedulerRejectedError(
+                    "Previše zahtjeva čeka na obradu, "
+                    "pokušajte ponovno za nekoliko minuta."
+                )
+            self._queues.setdefault(session_id, deque()).append(ticket)
+
+            shown_position = None
+            while True:
+                order = self._service_order()
+                if self._running < self.max_concurrent and order[0] is ticket:
+                    break
+                position = order.index(ticket) + 1
+                if on_position is not None and position != shown_position:
+                    on_position(position)
+                    shown_position = position
+                remaining = started + self.queue_timeout - time.monotonic()
+                if remaining <= 0:
+                    self._remove(session_id, ticket)
+                    self._rejected += 1
+                    self._changed.notify_all()
+                    raise SchedulerRejectedError(
+                        "Zahtjev je predugo čekao na obradu, pokušajte ponovno."
+                    )
+                self._changed.wait(min(remaining, 1.0))
+
+            self._remove(session_id, ticket)
+            if session_id in self._queues:
+                self._queues.move_to_end(session_id)
+            self._running += 1
+            waited = time.monotonic() - started
+            self._admitted += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            # Another waiter may now be first in line with a free slot.
+            self._changed.notify_all()
+            return waited
+
+    def release(self) -> None:
+        with self._changed:
+            self._running -= 1
+            self._changed.notify_all()
+
+    def stats(self) -> Dict:
+        """Return current load and cumulative queueing counters."""
+        with self._changed:
+            return {
+                "running": self._running,
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "max_concurrent": self.max_concurrent,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "total_wait_seconds": self._total_wait,
+                "max_wait_seconds": self._max_wait,
+            }
+
+
+class SlotReservation:
+    """A scheduler slot taken on first ``acquire`` and held until ``release``.
+
+    Lets a request path that may or may not call the API (cache hits do not)
+    wait for a slot only right before its first call.
+    """
+
+    def __init__(
+        self,
+        scheduler: FairScheduler,
+        session_id: str,
+        on_position: Optional[PositionCallback] = None,
+    ):
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.on_position = on_position
+        self.held = False
+
+    def acquire(self) -> None:
+        if self.held:
+            return
+        with span("queue_wait"):
+            waited = self.scheduler.acquire(self.session_id, self.on_position)
+        self.held = True
+        stats = self.scheduler.stats()
+        logger.debug(
+            "Request slot acquired after %.2fs "
+            "(running %d/%d, queued %d, rejected so far %d)",
+            waited,
+            stats["running"],
+            stats["max_concurrent"],
+            stats["queued"],
+            stats["rejected"],
+        )
+
+    def release(self) -> None:
+        if self.held:
+            self.held = False
+            self.scheduler.release()
+
+
+REQUEST_SCHEDULER = FairScheduler()
+register_gauges("request_scheduler", REQUEST_SCHEDULER.stats)
@@ -0,0 +1,103 @@
+"""Opt-in on-disk cache of completed model responses, replayed as streams."""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE", "0") == "1"
+CACHE_DIR = Path(os.environ.get("RESPONSE_CACHE_DIR", ".cache/responses"))
+CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_HOURS", "168")) * 3600
+CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# Entry files carry both timestamps the cache needs: mtime is when the response
+# was stored (checked against the TTL) and atime is its last use (LRU order).
+
+# Words plus their trailing whitespace, so replayed chunks rejoin losslessly.
+_REPLAY_CHUNK_RE = re.compile(r"\S+\s*|\s+")
+
+
+def response_cache_key(request_input, model: str, reasoning: Dict) -> str:
+    """Return the cache key for a request's full input and model settings."""
+    payload = json.dumps(
+        {"input": request_input, "model": model, "reasoning": reasoning},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str) -> Path:
+    return CACHE_DIR / f"{key}.json"
+
+
+def get_cached_response(key: str) -> Optional[Dict]:
+    """Return the stored ``{"text", "response_id", "created"}`` entry if fresh."""
+    cache_path = _cache_path(key)
+    try:
+        stored_at = cache_path.stat().st_mtime
+        with cache_path.open("r", encoding="utf-8") as cache_file:
+            entry = json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    now = time.time()
+    if now - stored_at > CACHE_TTL_SECONDS:
+        cache_path.unlink(missing_ok=True)
+        logger.debug("Response cache entry expired: %s", key[:12])
+        return None
+
+    # Record the use without moving the stored time the TTL is measured from.
+    os.utime(cache_path, (now, stored_at))
+    logger.debug("Response cache hit: %s", key[:12])
+    return entry
+
+
+def _evict() -> None:
+    """Drop expired entries, then least recently used ones beyond the size cap."""
+    now = time.time()
+    entries = []
+    total_size = 0
+    for entry in CACHE_DIR.glob("*.json"):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if now - stat.st_mtime > CACHE_TTL_SECONDS:
+            entry.unlink(missing_ok=True)
+            continue
+        entries.append((stat.st_atime, stat.st_size, entry))
+        total_size += stat.st_size
+
+    for _, size, entry in sorted(entries):
+        if total_size <= CACHE_MAX_BYTES:
+            break
+        entry.unlink(missing_ok=True)
+        logger.info("Evicted cached response: %s", entry.name)
+        total_size -= size
+
+
+def store_response(key: str, text: str, response_id: Optional[str]) -> None:
+    """Persist a completed response under ``key``."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    entry = {"text": text, "response_id": response_id, "created": time.time()}
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=CACHE_DIR, suffix=".tmp", delete=False
+    ) as tmp_file:
+        json.dump(entry, tmp_file, ensure_ascii=False)
+    os.replace(tmp_file.name, _cache_path(key))
+    os.utime(_cache_path(key), (entry["created"], entry["created"]))
+    _evict()
+
+
+def replay_stream(text: str) -> Iterator[str]:
+    """Yield a cached response in word-sized chunks, like a live stream."""
+    for match in _REPLAY_CHUNK_RE.finditer(text):
+        yield match.group(0)
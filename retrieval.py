@@ -0,0 +1,271 @@
+"""Local BM25 retrieval of document passages for the six analysis domains.
+
+Documents are split into paragraph-aligned chunks and tokenised once; the
+per-document chunk statistics are persisted under ``.cache/retrieval`` keyed by
+the SHA-256 of the text, so the strategy PDFs and repeated uploads are indexed
+only once per deployment. Scoring runs over whichever documents a request
+includes, entirely offline.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = Path(os.environ.get("RETRIEVAL_INDEX_DIR", ".cache/retrieval"))
+TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "2"))
+CHUNK_CHARS = 1200
+# Bump when chunking or tokenisation changes so persisted indexes are rebuilt.
+INDEX_VERSION = "1"
+# In-memory indexes are sized by their serialised JSON, a close proxy for the
+# chunk text they mostly consist of.
+MEMORY_MAX_BYTES = int(os.environ.get("RETRIEVAL_MEMORY_MAX_MB", "64")) * 1024 * 1024
+INDEX_MAX_BYTES = int(os.environ.get("RETRIEVAL_INDEX_MAX_MB", "256")) * 1024 * 1024
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Analysis domains from get_task_instructions with Croatian and English query
+# terms, since the comparison documents (Helsinki, Tartu) are in English.
+DOMAINS = [
+    (
+        "Vođenje digitalne preobrazbe",
+        "vođenje upravljanje digitalna preobrazba transformacija strategija "
+        "strateški ciljevi plan leadership governance digital transformation "
+        "strategy management vision",
+    ),
+    (
+        "Digitalne tehnologije u poučavanju i učenju",
+        "poučavanje učenje nastava studenti nastavnici e-učenje online digitalni "
+        "sadržaji teaching learning education students courses digital pedagogy",
+    ),
+    (
+        "Digitalne tehnologije u istraživanju i suradnji",
+        "istraživanje znanstveni suradnja projekti otvorena znanost podaci "
+        "research collaboration open science data partnerships innovation",
+    ),
+    (
+        "Digitalna infrastruktura i usluge",
+        "infrastruktura usluge informacijski sustavi mreža oprema cloud "
+        "infrastructure services systems network platforms IT services",
+    ),
+    (
+        "Kibernetička sigurnost",
+        "kibernetička sigurnost zaštita podataka privatnost rizik incident "
+        "cybersecurity security data protection privacy risk",
+    ),
+    (
+        "Spremnost za umjetnu inteligenciju",
+        "umjetna inteligencija strojno učenje automatizacija analitika "
+        "artificial intelligence AI machine learning automation analytics",
+    ),
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STEM_LENGTH = 6
+
+# text SHA-256 -> (persisted document index, size in bytes), least recently
+# used first
+_document_cache: "OrderedDict[str, Tuple[Dict, int]]" = OrderedDict()
+_document_cache_bytes = 0
+_lock = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens truncated to a fixed prefix as a crude stemmer.
+
+    Prefix truncation folds most Croatian case endings and English plurals
+    together without needing a language-specific stemmer.
+    """
+    return [
+        token[:_STEM_LENGTH]
+        for token in _TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and not token.isdigit()
+    ]
+
+
+def chunk_text(text: str) -> List[str]:
+    """Split text into roughly ``CHUNK_CHARS``-long, line-aligned passages."""
+    chunks = []
+    current: List[str] = []
+    current_length = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if current and current_length + len(line) > CHUNK_CHARS:
+            chunks.append("\n".join(current))
+            current, current_length = [], 0
+        current.append(line)
+        current_length += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _build_document_index(text: str) -> Dict:
+    chunks = chunk_text(text)
+    term_counts = [Counter(tokenize(chunk)) for chunk in chunks]
+    return {
+        "chunks": chunks,
+        "term_counts": [dict(counts) for counts in term_counts],
+        "lengths": [sum(counts.values()) for counts in term_counts],
+    }
+
+
+def _evict_indexes() -> None:
+    """Remove least recently used index files until the directory fits its cap."""
+    entries = []
+    total_size = 0
+    for entry in INDEX_DIR.glob("*.json"):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+        total_size += stat.st_size
+
+    for _, size, entry in sorted(entries):
+        if total_size <= INDEX_MAX_BYTES:
+            break
+        entry.unlink(missing_ok=True)
+        logger.info("Evicted retrieval index: %s", entry.name)
+        total_size -= size
+
+
+def _touch(index_path: Path) -> None:
+    # Touching the file keeps the mtime usable as the LRU timestamp.
+    try:
+        os.utime(index_path)
+    except FileNotFoundError:
+        pass
+
+
+def _remember(text_hash: str, index: Dict, size: int) -> None:
+    global _document_cache_bytes
+    with _lock:
+        previous = _document_cache.pop(text_hash, None)
+        if previous is not None:
+            _document_cache_bytes -= previous[1]
+        _document_cache[text_hash] = (index, size)
+        _document_cache_bytes += size
+        # The newest index always stays, even when it alone exceeds the cap.
+        while _document_cache_bytes > MEMORY_MAX_BYTES and len(_document_cache) > 1:
+            _, (_, evicted_size) = _document_cache.popitem(last=False)
+            _document_cache_bytes -= evicted_size
+
+
+def get_document_index(text: str) -> Dict:
+    """Return the chunk index for ``text``, building and persisting it once."""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    index_path = INDEX_DIR / f"{text_hash}-v{INDEX_VERSION}.json"
+    with _lock:
+        cached = _document_cache.get(text_hash)
+        if cached is not None:
+            _document_cache.move_to_end(text_hash)
+    if cached is not None:
+        _touch(index_path)
+        return cached[0]
+
+    try:
+        serialised = index_path.read_text(encoding="utf-8")
+        index = json.loads(serialised)
+    except (FileNotFoundError, json.JSONDecodeError):
+        index = _build_document_index(text)
+        serialised = json.dumps(index, ensure_ascii=False)
+        INDEX_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=INDEX_DIR, suffix=".tmp", delete=False
+        ) as tmp_file:
+            tmp_file.write(serialised)
+        os.replace(tmp_file.name, index_path)
+        logger.debug(
+            "Indexed document %s: %d chunks", text_hash[:12], len(index["chunks"])
+        )
+        _evict_indexes()
+    else:
+        _touch(index_path)
+
+    _remember(text_hash, index, len(serialised.encode("utf-8")))
+    return index
+
+
+def retrieve_domain_passages(
+    documents: List[Tuple[str, str]], top_k: int = TOP_K
+) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """Return the ``top_k`` BM25 passages of each document per analysis domain.
+
+    ``documents`` is a list of ``(title, text)`` pairs. The result lists, for
+    each domain in ``DOMAINS``, ``(title, passage)`` pairs grouped by document
+    in input order. Taking a quota per document keeps the institution's own
+    strategy represented next to longer comparison documents. A passage is
+    used for at most one domain, the first that ranks it.
+    """
+    passages: List[Tuple[int, str, Dict[str, int], int]] = []
+    for document_number, (_, text) in enumerate(documents):
+        index = get_document_index(text)
+        for chunk, counts, length in zip(
+            index["chunks"], index["term_counts"], index["lengths"]
+        ):
+            passages.append((document_number, chunk, counts, length))
+
+    if not passages:
+        return [(domain, []) for domain, _ in DOMAINS]
+
+    document_frequency: Counter = Counter()
+    for _, _, counts, _ in passages:
+        document_frequency.update(counts.keys())
+    passage_count = len(passages)
+    average_length = sum(length for *_, length in passages) / passage_count
+
+    used = set()
+    results = []
+    for domain, query in DOMAINS:
+        query_terms = set(tokenize(f"{domain} {query}"))
+        scores = []
+        for position, (_, _, counts, length) in enumerate(passages):
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term)
+                if not frequency:
+                    continue
+                df = document_frequency[term]
+                idf = math.log(1 + (passage_count - df + 0.5) / (df + 0.5))
+                score += idf * frequency * (BM25_K1 + 1) / (
+                    frequency
+                    + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                )
+            if score > 0:
+                scores.append((score, position))
+
+        selected: Dict[int, List[int]] = {}
+        for _, position in sorted(scores, key=lambda item: (-item[0], item[1])):
+            document_number = passages[position][0]
+            chosen = selected.setdefault(document_number, [])
+            if position in used or len(chosen) == top_k:
+                continue
+            used.add(position)
+            chosen.append(position)
+
+        results.append(
+            (
+                domain,
+                [
+                    (documents[document_number][0], passages[position][1])
+                    for document_number in sorted(selected)
+                    for position in selected[document_number]
+                ],
+            )
+        )
+
+    return results
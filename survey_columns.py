@@ -0,0 +1,286 @@
+"""Columnar on-disk format for survey answers.
+
+Each survey group lives in its own directory holding a respondents x questions
+answer matrix plus per-respondent ID columns as ``.npy`` files, and a single
+table of question texts::
+
+    survey_data/studenti/
+        answers.npy          int8, shape (respondents, questions), -1 = no answer
+        institution_ids.npy  int32, shape (respondents,)
+        responder_ids.npy    int32, shape (respondents,)
+        questions.json       [{"Question_ID": ..., "Question_Text": ...}, ...]
+
+While rows are being appended the directory also holds ``append_journal.json``
+with the row count and ``.npy`` headers from before the append, so readers see
+the old rows and an interrupted append can be rolled back.
+
+The per-response JSON records produced by earlier versions remain available as
+an interchange format through ``records_to_columns``/``columns_to_records``.
+"""
+
+import io
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+SURVEY_DIR = Path("survey_data")
+MISSING_ANSWER = -1
+
+ARRAY_FILES = ["answers.npy", "institution_ids.npy", "responder_ids.npy"]
+COLUMN_FILES = ARRAY_FILES + ["questions.json"]
+APPEND_JOURNAL = "append_journal.json"
+
+
+@dataclass
+class SurveyColumns:
+    answers: np.ndarray
+    institution_ids: np.ndarray
+    responder_ids: np.ndarray
+    question_ids: List[str]
+    question_texts: List[str]
+
+
+def is_columnar(path: Path) -> bool:
+    """Return True if ``path`` is a directory in the columnar survey format."""
+    return path.is_dir() and (path / "answers.npy").exists()
+
+
+def column_files(path: Path) -> List[Path]:
+    """Return the files that together make up a columnar survey directory."""
+    return [path / name for name in COLUMN_FILES]
+
+
+def load_survey_columns(path: Path, mmap: bool = True) -> SurveyColumns:
+    """Load a columnar survey directory, memory-mapping the arrays by default."""
+    mmap_mode = "r" if mmap else None
+    with (path / "questions.json").open("r", encoding="utf-8") as questions_file:
+        questions = json.load(questions_file)
+
+    arrays = [np.load(path / name, mmap_mode=mmap_mode) for name in ARRAY_FILES]
+
+    journal = _read_journal(path)
+    if journal is not None:
+        # An append is in progress or was interrupted; its rows are not committed.
+        arrays = [array[: journal["rows"]] for array in arrays]
+    if len({array.shape[0] for array in arrays}) != 1:
+        raise ValueError(f"Survey columns in {path} have different lengths")
+
+    answers, institution_ids, responder_ids = arrays
+    return SurveyColumns(
+        answers=answers,
+        institution_ids=institution_ids,
+        responder_ids=responder_ids,
+        question_ids=[question["Question_ID"] for question in questions],
+        question_texts=[question["Question_Text"] for question in questions],
+    )
+
+
+def write_survey_columns(path: Path, columns: SurveyColumns) -> None:
+    """Write ``columns`` into the directory ``path``, creating it if needed."""
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / "answers.npy", np.ascontiguousarray(columns.answers, np.int8))
+    np.save(path / "institution_ids.npy", columns.institution_ids.astype(np.int32))
+    np.save(path / "responder_ids.npy", columns.responder_ids.astype(np.int32))
+
+    questions = [
+        {"Question_ID": question_id, "Question_Text": question_text}
+        for question_id, question_text in zip(
+            columns.question_ids, columns.question_texts
+        )
+    ]
+    with (path / "questions.json").open("w", encoding="utf-8") as questions_file:
+        json.dump(questions, questions_file, ensure_ascii=False, indent=2)
+
+
+def _read_npy_header(npy_file) -> tuple:
+    version = np.lib.format.read_magic(npy_file)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(npy_file)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(npy_file)
+    return version, shape, fortran_order, dtype, npy_file.tell()
+
+
+def _read_journal(path: Path):
+    try:
+        with (path / APPEND_JOURNAL).open("r", encoding="utf-8") as journal_file:
+            return json.load(journal_file)
+    except FileNotFoundError:
+        return None
+
+
+def _write_journal(path: Path, journal: dict) -> None:
+    tmp_path = path / (APPEND_JOURNAL + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as journal_file:
+        json.dump(journal, journal_file)
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+    os.replace(tmp_path, path / APPEND_JOURNAL)
+
+
+def _roll_back_append(path: Path) -> None:
+    """Restore the arrays recorded in an interrupted append's journal."""
+    journal = _read_journal(path)
+    if journal is not None:
+        for name, (size, header) in journal["files"].items():
+            original_path = path / (name + ".orig")
+            if original_path.exists():
+                os.replace(original_path, path / name)
+                continue
+            with (path / name).open("r+b") as npy_file:
+                npy_file.truncate(size)
+                npy_file.write(bytes.fromhex(header))
+        (path / APPEND_JOURNAL).unlink()
+
+    for name in ARRAY_FILES:
+        (path / (name + ".orig")).unlink(missing_ok=True)
+
+
+def _append_npy(path: Path, rows: np.ndarray) -> None:
+    """Append rows to a C-ordered ``.npy`` file, rewriting only its header.
+
+    The rows are written before the header that counts them, so an
+    interruption leaves the previous header describing the previous rows.
+    """
+    with path.open("r+b") as npy_file:
+        version, shape, fortran_order, dtype, header_length = _read_npy_header(
+            npy_file
+        )
+
+        if fortran_order or dtype != rows.dtype or shape[1:] != rows.shape[1:]:
+            raise ValueError(f"Cannot append {rows.shape} {rows.dtype} rows to {path}")
+
+        header = io.BytesIO()
+        header_data = {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (shape[0] + rows.shape[0],) + shape[1:],
+        }
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(header, header_data)
+        else:
+            np.lib.format.write_array_header_2_0(header, header_data)
+
+        if len(header.getvalue()) == header_length:
+            npy_file.seek(0, io.SEEK_END)
+            npy_file.write(np.ascontiguousarray(rows).tobytes())
+            npy_file.flush()
+            os.fsync(npy_file.fileno())
+            npy_file.seek(0)
+            npy_file.write(header.getvalue())
+            return
+
+    # The grown shape no longer fits the header padding; rewrite the file once,
+    # keeping the original under ``.orig`` until the append is committed.
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as tmp_file:
+        np.save(tmp_file, np.concatenate([np.load(path), rows]))
+    os.link(path, path.with_name(path.name + ".orig"))
+    os.replace(tmp_path, path)
+
+
+def append_survey_rows(path: Path, rows: SurveyColumns) -> None:
+    """Append respondents to a columnar survey directory in place.
+
+    ``rows`` must use the directory's question order. Only the ``.npy``
+    headers are rewritten; existing answers are not read. The previous row
+    count and headers are journaled first, so a crash part-way never leaves
+    columns of different lengths: readers ignore the uncommitted rows and the
+    next append rolls them back.
+    """
+    _roll_back_append(path)
+
+    files = {}
+    lengths = set()
+    for name in ARRAY_FILES:
+        with (path / name).open("rb") as npy_file:
+            _, shape, _, _, header_length = _read_npy_header(npy_file)
+            npy_file.seek(0)
+            header = npy_file.read(header_length)
+        files[name] = ((path / name).stat().st_size, header.hex())
+        lengths.add(shape[0])
+    if len(lengths) != 1:
+        raise ValueError(f"Survey columns in {path} have different lengths")
+    _write_journal(path, {"rows": lengths.pop(), "files": files})
+
+    _append_npy(path / "answers.npy", np.asarray(rows.answers, np.int8))
+    _append_npy(path / "institution_ids.npy", np.asarray(rows.institution_ids, np.int32))
+    _append_npy(path / "responder_ids.npy", np.asarray(rows.responder_ids, np.int32))
+
+    (path / APPEND_JOURNAL).unlink()
+    for name in ARRAY_FILES:
+        (path / (name + ".orig")).unlink(missing_ok=True)
+
+
+def records_to_columns(records: list[dict]) -> SurveyColumns:
+    """Convert per-respondent JSON records into columnar form."""
+    question_index = {}
+    question_texts = []
+    for responder in records:
+        for response in responder["Responses"]:
+            if response["Question_ID"] not in question_index:
+                question_index[response["Question_ID"]] = len(question_index)
+                question_texts.append(response["Question_Text"])
+
+    answers = np.full((len(records), len(question_index)), MISSING_ANSWER, np.int8)
+    for row, responder in enumerate(records):
+        for response in responder["Responses"]:
+            answers[row, question_index[response["Question_ID"]]] = response["Answer"]
+
+    return SurveyColumns(
+        answers=answers,
+        institution_ids=np.array(
+            [responder["Institution_ID"] for responder in records], np.int32
+        ),
+        responder_ids=np.array(
+            [responder["Responder_ID"] for responder in records], np.int32
+        ),
+        question_ids=list(question_index),
+        question_texts=question_texts,
+    )
+
+
+def columns_to_records(columns: SurveyColumns) -> list[dict]:
+    """Convert columnar survey data back into per-respondent JSON records."""
+    records = []
+    for row, answers in enumerate(np.asarray(columns.answers).tolist()):
+        records.append(
+            {
+                "Institution_ID": int(columns.institution_ids[row]),
+                "Responder_ID": int(columns.responder_ids[row]),
+                "Responses": [
+                    {
+                        "Question_ID": question_id,
+                        "Question_Text": question_text,
+                        "Answer": answer,
+                    }
+                    for question_id, question_text, answer in zip(
+                        columns.question_ids, columns.question_texts, answers
+                    )
+                    if answer != MISSING_ANSWER
+                ],
+            }
+        )
+    return records
+
+
+def column_averages(columns: SurveyColumns) -> dict:
+    """Return per-question averages in the ``calculate_averages`` result shape."""
+    answers = np.asarray(columns.answers)
+    answered = answers != MISSING_ANSWER
+    counts = answered.sum(axis=0)
+    sums = np.where(answered, answers, 0).sum(axis=0, dtype=np.int64)
+
+    averages = {}
+    question_texts = {}
+    for index, question_id in enumerate(columns.question_ids):
+        if counts[index] == 0:
+            continue
+        averages[question_id] = int(sums[index]) / int(counts[index])
+        question_texts[question_id] = columns.question_texts[index]
+
+    return {"averages": averages, "question_texts": question_texts}
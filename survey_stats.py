@@ -0,0 +1,173 @@
+"""Single-pass, bounded-memory aggregation of survey answers.
+
+Respondents are consumed one at a time from JSON exports (or in row blocks
+from the columnar format), so memory depends on the number of questions, not
+on the number of respondents. Alongside the plain averages each question gets
+its count, population variance (Welford/Chan), min/max and an answer
+histogram.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+from survey_columns import MISSING_ANSWER, is_columnar, load_survey_columns
+
+_READ_CHUNK_SIZE = 64 * 1024
+_ROW_BLOCK_SIZE = 64 * 1024
+
+
+class _QuestionStats:
+    __slots__ = ("count", "total", "mean", "m2", "minimum", "maximum", "histogram")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum: int | None = None
+        self.maximum: int | None = None
+        self.histogram: Dict[int, int] = {}
+
+    def add(self, answer: int) -> None:
+        self.count += 1
+        self.total += answer
+        delta = answer - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (answer - self.mean)
+        self.minimum = answer if self.minimum is None else min(self.minimum, answer)
+        self.maximum = answer if self.maximum is None else max(self.maximum, answer)
+        self.histogram[answer] = self.histogram.get(answer, 0) + 1
+
+    def merge_block(self, answers: np.ndarray) -> None:
+        """Fold a block of non-missing answers in using Chan's parallel update."""
+        block_count = int(answers.size)
+        if not block_count:
+            return
+        block_mean = float(answers.mean())
+        block_m2 = float(((answers - block_mean) ** 2).sum())
+
+        combined = self.count + block_count
+        delta = block_mean - self.mean
+        self.mean += delta * block_count / combined
+        self.m2 += block_m2 + delta * delta * self.count * block_count / combined
+        self.count = combined
+        self.total += int(answers.sum(dtype=np.int64))
+
+        block_min, block_max = int(answers.min()), int(answers.max())
+        self.minimum = block_min if self.minimum is None else min(self.minimum, block_min)
+        self.maximum = block_max if self.maximum is None else max(self.maximum, block_max)
+        values, counts = np.unique(answers, return_counts=True)
+        for value, count in zip(values.tolist(), counts.tolist()):
+            self.histogram[value] = self.histogram.get(value, 0) + count
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "variance": self.m2 / self.count,
+            "min": self.minimum,
+            "max": self.maximum,
+            "histogram": dict(sorted(self.histogram.items())),
+        }
+
+
+class SurveyAggregator:
+    """Accumulates per-question statistics one respondent or row block at a time."""
+
+    def __init__(self) -> None:
+        self._stats: Dict[str, _QuestionStats] = {}
+        self._question_texts: Dict[str, str] = {}
+
+    def _question(self, question_id: str, question_text: str) -> _QuestionStats:
+        stats = self._stats.get(question_id)
+        if stats is None:
+            stats = self._stats[question_id] = _QuestionStats()
+            self._question_texts[question_id] = question_text
+        return stats
+
+    def add_respondent(self, responder: Dict[str, Any]) -> None:
+        for response in responder["Responses"]:
+            self._question(response["Question_ID"], response["Question_Text"]).add(
+                response["Answer"]
+            )
+
+    def add_block(
+        self, answers: np.ndarray, question_ids: List[str], question_texts: List[str]
+    ) -> None:
+        for index, question_id in enumerate(question_ids):
+            column = answers[:, index]
+            self._question(question_id, question_texts[index]).merge_block(
+                column[column != MISSING_ANSWER]
+            )
+
+    def result(self) -> Dict[str, Any]:
+        """Return ``calculate_averages``-shaped output plus a ``stats`` section."""
+        answered = {qid: s for qid, s in self._stats.items() if s.count}
+        return {
+            "averages": {qid: s.total / s.count for qid, s in answered.items()},
+            "question_texts": {qid: self._question_texts[qid] for qid in answered},
+            "stats": {qid: s.as_dict() for qid, s in answered.items()},
+        }
+
+
+def iter_json_respondents(json_path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(json_path, "r", encoding="utf-8") as json_file:
+        buffer = ""
+        position = 0
+        started = False
+        at_eof = False
+
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{json_path} is not a JSON array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+                try:
+                    element, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if at_eof:
+                        raise
+                else:
+                    yield element
+                    continue
+            elif at_eof:
+                raise ValueError(f"{json_path} ended before the JSON array closed")
+
+            # Drop consumed text so the buffer only ever holds about one respondent.
+            chunk = json_file.read(_READ_CHUNK_SIZE)
+            buffer = buffer[position:] + chunk
+            position = 0
+            at_eof = not chunk
+
+
+def stream_survey_stats(source_path: Path) -> Dict[str, Any]:
+    """Aggregate a JSON export or columnar survey directory in a single pass."""
+    source_path = Path(source_path)
+    aggregator = SurveyAggregator()
+
+    if is_columnar(source_path):
+        columns = load_survey_columns(source_path)
+        for start in range(0, len(columns.answers), _ROW_BLOCK_SIZE):
+            aggregator.add_block(
+                np.asarray(columns.answers[start : start + _ROW_BLOCK_SIZE]),
+                columns.question_ids,
+                columns.question_texts,
+            )
+    else:
+        for responder in iter_json_respondents(source_path):
+            aggregator.add_respondent(responder)
+
+    return aggregator.result()
@@ -0,0 +1,108 @@
+"""Survey sources per category, with change detection that avoids rehashing."""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from survey_columns import (
+    SURVEY_DIR,
+    SurveyColumns,
+    column_files,
+    is_columnar,
+    load_survey_columns,
+    records_to_columns,
+)
+
+CATEGORIES = ["it_strucnjaci", "nastavnici", "studenti", "uprava"]
+
+JSON_DIR = Path("json_data")
+AVERAGES_DIR = Path("averages")
+
+# category -> ((mtime_ns, size) of the source file, fingerprint of its content)
+_hash_cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def survey_source(category: str) -> Path:
+    """Return the columnar survey directory for ``category``, else its JSON file."""
+    columnar_path = SURVEY_DIR / category
+    if is_columnar(columnar_path):
+        return columnar_path
+    return JSON_DIR / f"{category}.json"
+
+
+def load_category_columns(category: str) -> SurveyColumns:
+    """Return the raw answers of ``category`` in columnar form."""
+    source_path = survey_source(category)
+    if source_path.is_dir():
+        return load_survey_columns(source_path)
+
+    with source_path.open("r", encoding="utf-8") as json_file:
+        return records_to_columns(json.load(json_file))
+
+
+def _source_files(source_path: Path) -> list[Path]:
+    return column_files(source_path) if source_path.is_dir() else [source_path]
+
+
+def _files_sha256(paths: list[Path]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with path.open("rb") as source_file:
+            while chunk := source_file.read(1024 * 1024):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def atomic_write_json(path: Path, payload: Any) -> None:
+    """Write JSON next to ``path`` and rename it into place in one step."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False
+    ) as tmp_file:
+        json.dump(payload, tmp_file, ensure_ascii=False, indent=2)
+    # NamedTemporaryFile creates owner-only files; keep the usual data file mode.
+    os.chmod(tmp_file.name, 0o644)
+    os.replace(tmp_file.name, path)
+
+
+def source_signature(category: str) -> Tuple[int, int]:
+    """Return the latest mtime and total size of the files backing ``category``."""
+    stats = [path.stat() for path in _source_files(survey_source(category))]
+    return (max(s.st_mtime_ns for s in stats), sum(s.st_size for s in stats))
+
+
+def source_hash(category: str) -> str:
+    """Return the fingerprint of ``category``'s source, rehashing only after changes.
+
+    This is the SHA-256 of the source files, unless rows appended since were
+    folded into it by ``extend_source_hash``.
+    """
+    signature = source_signature(category)
+    cached = _hash_cache.get(category)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    content_hash = _files_sha256(_source_files(survey_source(category)))
+    _hash_cache[category] = (signature, content_hash)
+    return content_hash
+
+
+def remember_source_hash(
+    category: str, signature: Tuple[int, int], content_hash: str
+) -> None:
+    """Trust ``content_hash`` for ``category`` while its source keeps ``signature``."""
+    _hash_cache[category] = (tuple(signature), content_hash)
+
+
+def extend_source_hash(category: str, previous_hash: str, rows_digest: str) -> str:
+    """Fold the digest of just-appended rows into the source fingerprint.
+
+    The existing files are not reread; the result is remembered for the
+    source's new signature and returned.
+    """
+    content_hash = hashlib.sha256(f"{previous_hash}:{rows_digest}".encode()).hexdigest()
+    remember_source_hash(category, source_signature(category), content_hash)
+    return content_hash
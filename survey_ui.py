@@ -1,12 +1,17 @@
 """Streamlit UI helpers for presenting survey results."""
 
-import json
-from pathlib import Path
-
 import pandas as pd
 import streamlit as st
 
-from prompt_builder import CATEGORIES
+from institution_index import (
+    index_signature,
+    institution_averages,
+    institution_respondents,
+    list_institutions,
+    national_averages,
+)
+from prompt_builder import DEFAULT_INSTITUTION_ID, institution_name
+from survey_store import CATEGORIES
 
 CATEGORY_LABELS = {
     "it_strucnjaci": "IT stručnjaci",
@@ -16,41 +21,85 @@ CATEGORY_LABELS = {
 }
 
 
-def display_survey_data() -> None:
+def select_institution() -> int:
+    """Let the user pick an institution when the survey data covers several."""
+    institution_ids = list_institutions()
+    if len(institution_ids) <= 1:
+        return institution_ids[0] if institution_ids else DEFAULT_INSTITUTION_ID
+
+    default_index = (
+        institution_ids.index(DEFAULT_INSTITUTION_ID)
+        if DEFAULT_INSTITUTION_ID in institution_ids
+        else 0
+    )
+    return st.selectbox(
+        "Visoko učilište",
+        institution_ids,
+        index=default_index,
+        format_func=lambda institution_id: "{} ({})".format(
+            *institution_name(institution_id)
+        ),
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _survey_table(category, institution_id, include_baseline, sources_signature):
+    """Return the table and summary metrics for one category tab, or None.
+
+    ``sources_signature`` is not used directly; it keys the cache so tables are
+    rebuilt only after the survey files change.
+    """
+    data = institution_averages(category, institution_id)
+    if data is None:
+        return None
+    baseline = national_averages(category) if include_baseline else None
+
+    questions_data = []
+    for question_id, average in data["averages"].items():
+        question_text = data["question_texts"].get(question_id, "N/A")
+        row = {
+            "Pitanje ID": question_id,
+            "Tekst pitanja": question_text,
+            "Prosječna ocjena": f"{average:.2f}",
+        }
+        if baseline is not None:
+            row["Nacionalni prosjek"] = f"{baseline['averages'][question_id]:.2f}"
+        questions_data.append(row)
+
+    averages_list = list(data["averages"].values())
+    metrics = {
+        "questions": len(averages_list),
+        "average": sum(averages_list) / len(averages_list),
+        "best": max(averages_list),
+        "respondents": institution_respondents(category, institution_id),
+    }
+    return pd.DataFrame(questions_data), metrics
+
+
+def display_survey_data(institution_id: int = DEFAULT_INSTITUTION_ID) -> None:
     """Display survey averages in an organized format."""
     st.markdown("### 📊 Pregled prosječnih ocjena iz upitnika")
 
     tabs = st.tabs([CATEGORY_LABELS[cat] for cat in CATEGORIES])
+    include_baseline = len(list_institutions()) > 1
+    signature = index_signature()
 
     for index, category in enumerate(CATEGORIES):
         with tabs[index]:
-            avg_path = Path("averages") / f"{category}_data.json"
-            if not avg_path.exists():
+            table = _survey_table(category, institution_id, include_baseline, signature)
+            if table is None:
                 st.error(f"Nema dostupnih podataka za {CATEGORY_LABELS[category]}")
                 continue
+            df, metrics = table
 
-            with avg_path.open("r", encoding="utf-8") as json_file:
-                data = json.load(json_file)
-
-            questions_data = []
-            for question_id, average in data["averages"].items():
-                question_text = data["question_texts"].get(question_id, "N/A")
-                questions_data.append(
-                    {
-                        "Pitanje ID": question_id,
-                        "Tekst pitanja": question_text,
-                        "Prosječna ocjena": f"{average:.2f}",
-                    }
-                )
-
-            df = pd.DataFrame(questions_data)
             st.dataframe(df, use_container_width=True, hide_index=True)
 
-            averages_list = list(data["averages"].values())
-            col1, col2, col3 = st.columns(3)
+            col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Ukupno pitanja", len(averages_list))
+                st.metric("Ukupno pitanja", metrics["questions"])
             with col2:
-                st.metric("Prosječna ocjena", f"{sum(averages_list)/len(averages_list):.2f}")
+                st.metric("Prosječna ocjena", f"{metrics['average']:.2f}")
             with col3:
-                st.metric("Najbolja ocjena", f"{max(averages_list):.2f}")
+                st.metric("Najbolja ocjena", f"{metrics['best']:.2f}")
+            with col4:
+                st.metric("Broj ispitanika", metrics["respondents"])
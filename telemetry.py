@@ -0,0 +1,336 @@
+"""Lightweight stage timings and per-request metrics.
+
+Code marks a stage with ``with span("name"):``. Inside a request started by
+``start_request`` the span becomes part of that request's trace, which ends
+as one JSON line (``TELEMETRY_LOG``) with its stages, prompt size,
+time to first token and streaming rate. Every span and request also feeds
+process-wide totals that are rendered in the Prometheus text format, written
+to ``TELEMETRY_PROMETHEUS_FILE`` and/or served on ``TELEMETRY_PROMETHEUS_PORT``
+at ``/metrics``.
+
+Telemetry is off unless ``TELEMETRY=1``; ``span`` then returns a shared
+no-op object, so instrumented code pays one flag check per stage.
+
+Diagnostic messages go through ``logging``; entry points call
+``configure_logging`` to send them to stderr at ``LOG_LEVEL``.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_ENABLED = os.environ.get("TELEMETRY", "0") == "1"
+TELEMETRY_LOG = Path(os.environ.get("TELEMETRY_LOG", ".cache/telemetry/requests.jsonl"))
+TELEMETRY_PROMETHEUS_FILE = os.environ.get("TELEMETRY_PROMETHEUS_FILE")
+TELEMETRY_PROMETHEUS_PORT = int(os.environ.get("TELEMETRY_PROMETHEUS_PORT", "0"))
+
+METRIC_PREFIX = "carnet"
+
+_current_request: contextvars.ContextVar = contextvars.ContextVar(
+    "telemetry_request", default=None
+)
+_lock = threading.Lock()
+# stage -> [count, total seconds, max seconds]
+_stage_totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+# request kind -> counters
+_request_totals: Dict[str, Dict[str, float]] = defaultdict(
+    lambda: {
+        "count": 0,
+        "errors": 0,
+        "seconds": 0.0,
+        "ttft_count": 0,
+        "ttft_seconds": 0.0,
+        "output_chars": 0,
+        "prompt_chars": 0,
+    }
+)
+# metric name -> function returning {label value: number}, e.g. queue stats
+_gauge_sources: Dict[str, Callable[[], Dict[str, float]]] = {}
+_server_started = False
+
+
+def configure_logging(default_level: str = "INFO") -> None:
+    """Log to stderr at ``LOG_LEVEL``, or ``default_level`` if it is unset."""
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", default_level).upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+def _record_stage(name: str, seconds: float) -> None:
+    with _lock:
+        totals = _stage_totals[name]
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] = max(totals[2], seconds)
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "started")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        """Attach attributes (sizes, counts, cache hits) to the span."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.started
+        _record_stage(self.name, seconds)
+        request = _current_request.get()
+        if request is not None:
+            request.add_span(self.name, self.started, seconds, self.attrs)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attrs):
+    """Time the enclosed block as stage ``name``."""
+    if not TELEMETRY_ENABLED:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+
+class RequestTrace:
+    """Stages and streaming statistics of one model request."""
+
+    def __init__(self, kind: str, attrs: Dict):
+        self.request_id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.attrs = attrs
+        self.spans: List[Dict] = []
+        self.started = time.perf_counter()
+        self.first_output: Optional[float] = None
+        self.output_chars = 0
+        self._token = _current_request.set(self)
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def add_span(self, name: str, started: float, seconds: float, attrs: Dict) -> None:
+        entry = {
+            "name": name,
+            "offset_s": round(started - self.started, 6),
+            "duration_s": round(seconds, 6),
+        }
+        if attrs:
+            entry.update(attrs)
+        self.spans.append(entry)
+
+    def record_output(self, text: str) -> None:
+        """Count a streamed chunk; the first one fixes time to first token."""
+        if self.first_output is None:
+            self.first_output = time.perf_counter()
+        self.output_chars += len(text)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Write the request's JSON line and fold it into the totals."""
+        ended = time.perf_counter()
+        try:
+            _current_request.reset(self._token)
+        except ValueError:
+            # Finished from another context (e.g. a generator closed elsewhere).
+            _current_request.set(None)
+
+        ttft = self.first_output - self.started if self.first_output else None
+        streaming = ended - self.first_output if self.first_output else 0.0
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "request_id": self.request_id,
+            "kind": self.kind,
+            **self.attrs,
+            "duration_s": round(ended - self.started, 6),
+            "ttft_s": round(ttft, 6) if ttft is not None else None,
+            "output_chars": self.output_chars,
+            "chars_per_s": (
+                round(self.output_chars / streaming, 1) if streaming > 0 else None
+            ),
+            "error": None if error is None else f"{type(error).__name__}: {error}",
+            "spans": self.spans,
+        }
+
+        with _lock:
+            totals = _request_totals[self.kind]
+            totals["count"] += 1
+            totals["errors"] += error is not None
+            totals["seconds"] += ended - self.started
+            totals["output_chars"] += self.output_chars
+            totals["prompt_chars"] += self.attrs.get("prompt_chars", 0)
+            if ttft is not None:
+                totals["ttft_count"] += 1
+                totals["ttft_seconds"] += ttft
+            TELEMETRY_LOG.parent.mkdir(parents=True, exist_ok=True)
+            with TELEMETRY_LOG.open("a", encoding="utf-8") as log_file:
+                log_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        if TELEMETRY_PROMETHEUS_FILE:
+            write_prometheus_file(Path(TELEMETRY_PROMETHEUS_FILE))
+
+
+class _NullTrace:
+    def set(self, **attrs) -> None:
+        pass
+
+    def record_output(self, text: str) -> None:
+        pass
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+_NULL_TRACE = _NullTrace()
+
+
+def start_request(kind: str, **attrs):
+    """Start tracing a request in the current context and return its trace."""
+    if not TELEMETRY_ENABLED:
+        return _NULL_TRACE
+    _ensure_server()
+    return RequestTrace(kind, attrs)
+
+
+def annotate(**attrs) -> None:
+    """Attach attributes such as prompt size to the current request, if any."""
+    if not TELEMETRY_ENABLED:
+        return
+    request = _current_request.get()
+    if request is not None:
+        request.set(**attrs)
+
+
+def register_gauges(name: str, source: Callable[[], Dict[str, float]]) -> None:
+    """Export ``source()``'s numbers as gauge ``name`` labelled by key."""
+    _gauge_sources[name] = source
+
+
+def _number(value: float) -> str:
+    return str(value) if isinstance(value, int) else f"{value:.6f}"
+
+
+def render_prometheus() -> str:
+    """Return all totals and gauges in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        stages = {name: list(totals) for name, totals in _stage_totals.items()}
+        requests = {kind: dict(totals) for kind, totals in _request_totals.items()}
+
+    lines.append(f"# TYPE {METRIC_PREFIX}_stage_seconds summary")
+    for name, (count, seconds, _) in sorted(stages.items()):
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{name}"}} {count}')
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{name}"}} {seconds:.6f}')
+    lines.append(f"# TYPE {METRIC_PREFIX}_stage_seconds_max gauge")
+    for name, (_, _, maximum) in sorted(stages.items()):
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_max{{stage="{name}"}} {maximum:.6f}')
+
+    lines.append(f"# TYPE {METRIC_PREFIX}_time_to_first_token_seconds summary")
+    for kind, totals in sorted(requests.items()):
+        lines.append(
+            f'{METRIC_PREFIX}_time_to_first_token_seconds_count{{kind="{kind}"}} '
+            f"{totals['ttft_count']}"
+        )
+        lines.append(
+            f'{METRIC_PREFIX}_time_to_first_token_seconds_sum{{kind="{kind}"}} '
+            f"{totals['ttft_seconds']:.6f}"
+        )
+
+    request_counters = [
+        ("requests_total", "count"),
+        ("request_errors_total", "errors"),
+        ("request_seconds_total", "seconds"),
+        ("output_chars_total", "output_chars"),
+        ("prompt_chars_total", "prompt_chars"),
+    ]
+    for metric, key in request_counters:
+        lines.append(f"# TYPE {METRIC_PREFIX}_{metric} counter")
+        for kind, totals in sorted(requests.items()):
+            lines.append(
+                f'{METRIC_PREFIX}_{metric}{{kind="{kind}"}} {_number(totals[key])}'
+            )
+
+    for name, source in sorted(_gauge_sources.items()):
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        for label, value in sorted(source().items()):
+            lines.append(f'{METRIC_PREFIX}_{name}{{name="{label}"}} {_number(value)}')
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_file(path: Path) -> None:
+    """Atomically write the metrics, e.g. for node_exporter's textfile collector."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False
+    ) as tmp_file:
+        tmp_file.write(render_prometheus())
+    os.chmod(tmp_file.name, 0o644)
+    os.replace(tmp_file.name, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _ensure_server() -> None:
+    """Serve ``/metrics`` once per process if a port is configured."""
+    global _server_started
+    if not TELEMETRY_PROMETHEUS_PORT:
+        return
+    with _lock:
+        if _server_started:
+            return
+        _server_started = True
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", TELEMETRY_PROMETHEUS_PORT), _MetricsHandler)
+    except OSError as exc:
+        logger.warning(
+            "Could not serve metrics on port %s: %s", TELEMETRY_PROMETHEUS_PORT, exc
+        )
+        return
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving Prometheus metrics on :%s/metrics", TELEMETRY_PROMETHEUS_PORT)
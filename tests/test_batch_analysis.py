@@ -0,0 +1,46 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import openai_client
+from batch_analysis import build_jobs, run_batch
+from fake_openai_server import FakeResponsesConfig, serve_in_thread
+
+
+def _job(uploads):
+    (job,) = build_jobs([20], [True], [False], [False], ["Pokreni analizu."], uploads)
+    return job
+
+
+def test_job_identity_follows_upload_content():
+    original = _job((("plan.pdf", "a" * 64),))
+
+    assert _job((("plan.pdf", "a" * 64),)).name == original.name
+    assert _job((("plan.pdf", "b" * 64),)).name != original.name
+
+
+def test_batch_job_runs_without_streamlit_secrets(tmp_path, monkeypatch):
+    config = FakeResponsesConfig(first_token_delay=0, chunk_delay=0)
+    server, base_url = serve_in_thread(config)
+    monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.setattr(openai_client, "_client", None)
+    # A working directory without .streamlit/, sharing only the survey data.
+    for name in ("survey_data", "averages", "json_data"):
+        (tmp_path / name).symlink_to(Path(name).resolve())
+    monkeypatch.chdir(tmp_path)
+    output_dir = tmp_path / "reports"
+    output_dir.mkdir()
+    (job,) = build_jobs([20], [False], [False], [False], ["Pokreni analizu."], ())
+
+    try:
+        counts = asyncio.run(run_batch([job], output_dir, [], concurrency=1))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert counts == {"done": 1, "skipped": 0, "failed": 0}
+    record = json.loads((output_dir / f"{job.name}.json").read_text(encoding="utf-8"))
+    assert record["response_chars"] == len(config.text)
+    assert "app" not in sys.modules
@@ -0,0 +1,10 @@
+from benchmark import SCALES, build_cases, run_benchmarks
+
+
+def test_every_case_runs_at_smoke_scale(tmp_path):
+    report = run_benchmarks("smoke", tmp_path, repeat=1)
+
+    results = report["results"]
+    assert set(results) == {case.name for case in build_cases(SCALES["smoke"])}
+    failed = {name: result for name, result in results.items() if "error" in result}
+    assert not failed
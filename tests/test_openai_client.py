@@ -0,0 +1,63 @@
+import pytest
+
+import openai_client
+from fake_openai_server import FakeResponsesConfig, serve_in_thread
+from openai_client import create_response_stream, get_client
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    config = FakeResponsesConfig(first_token_delay=0, chunk_delay=0)
+    server, base_url = serve_in_thread(config)
+    monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.setattr(openai_client, "_client", None)
+    monkeypatch.setattr(openai_client, "OPENAI_RETRY_BASE_SECONDS", 0.01)
+    yield config
+    server.shutdown()
+    server.server_close()
+
+
+def _text(stream):
+    return "".join(
+        event.delta for event in stream if event.type == "response.output_text.delta"
+    )
+
+
+def test_stream_yields_full_text(fake_server):
+    stream = create_response_stream(model="fake-model", input="Bok")
+    assert _text(stream) == fake_server.text
+    assert fake_server.requests == 1
+
+
+def test_stream_retries_rejected_requests(fake_server):
+    fake_server.fail_first = 2
+    stream = create_response_stream(model="fake-model", input="Bok")
+    assert _text(stream) == fake_server.text
+    assert fake_server.requests == 3
+
+
+def test_failed_stream_is_closed_before_retry(fake_server, monkeypatch):
+    fake_server.fail_stream_first = 1
+    responses = get_client().responses
+    create = responses.create
+    streams = []
+
+    def recording_create(**request):
+        streams.append(create(**request))
+        return streams[-1]
+
+    monkeypatch.setattr(responses, "create", recording_create)
+    stream = create_response_stream(model="fake-model", input="Bok")
+
+    assert _text(stream) == fake_server.text
+    assert len(streams) == 2
+    assert streams[0].response.is_closed
+
+
+def test_exhausted_retries_raise(fake_server, monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_MAX_RETRIES", 1)
+    fake_server.fail_first = 5
+    with pytest.raises(openai_client.RateLimitError):
+        create_response_stream(model="fake-model", input="Bok")
+    assert fake_server.requests == 2
@@ -0,0 +1,59 @@
+from prompt_budget import PromptSection, assemble_prompt, estimate_tokens
+from prompt_builder import assemble_analysis_prompt
+
+
+def _lines(word: str, count: int) -> str:
+    return "".join(f"{word} {line}\n" for line in range(count))
+
+
+def test_lowest_priority_sections_are_trimmed_first():
+    sections = [
+        PromptSection("strategy", _lines("strategy", 100), 60),
+        PromptSection("comparison", _lines("comparison", 100), 40),
+        PromptSection("survey", _lines("survey", 100), 80, trimmable=False),
+        PromptSection("context", _lines("context", 10), 90, trimmable=False),
+    ]
+    tokens = {section.name: estimate_tokens(section.text) for section in sections}
+    # Room for everything but the comparison document and half the strategy.
+    budget = tokens["survey"] + tokens["context"] + tokens["strategy"] // 2
+
+    prompt, report = assemble_prompt(sections, budget)
+
+    kept = {section["name"]: section for section in report["sections"]}
+    assert report["within_budget"]
+    assert kept["comparison"]["kept_tokens"] == 0
+    assert 0 < kept["strategy"]["kept_tokens"] < tokens["strategy"]
+    assert not kept["survey"]["trimmed"]
+    assert not kept["context"]["trimmed"]
+    assert sum(section["chars"] for section in report["sections"]) == len(prompt)
+
+
+def test_untrimmable_sections_are_kept_over_budget():
+    sections = [
+        PromptSection("strategy", _lines("strategy", 100), 60),
+        PromptSection("survey", _lines("survey", 100), 80, trimmable=False),
+    ]
+    prompt, report = assemble_prompt(sections, estimate_tokens(sections[1].text) // 2)
+
+    assert prompt == sections[1].text
+    assert not report["within_budget"]
+
+
+def test_static_prefix_ends_where_user_context_begins():
+    upload = ("upload.pdf", _lines("Digitalna strategija učilišta", 400))
+    prompt, report = assemble_analysis_prompt(
+        "Fokus na umjetnu inteligenciju.",
+        False,
+        False,
+        False,
+        uploaded_documents=[upload],
+        use_retrieval=False,
+        token_budget=6000,
+    )
+
+    kept = {section["name"]: section for section in report["sections"]}
+    assert kept["user_docs"]["trimmed"]
+    assert not kept["survey"]["trimmed"]
+    assert prompt[report["static_prefix_chars"] :].startswith(
+        "\n\nKontekst/upute korisnika:\n"
+    )
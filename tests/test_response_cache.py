@@ -0,0 +1,28 @@
+import os
+import time
+
+import response_cache
+from response_cache import get_cached_response, store_response
+
+
+def test_lru_and_ttl_share_file_timestamps(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "CACHE_DIR", tmp_path)
+    store_response("old", "a" * 100, "resp_old")
+    store_response("new", "b" * 100, "resp_new")
+    old_path = tmp_path / "old.json"
+    stored_at = time.time() - 60
+    os.utime(old_path, (stored_at, stored_at))
+
+    # Reading the older entry makes it the most recently used one ...
+    assert get_cached_response("old")["text"] == "a" * 100
+    assert old_path.stat().st_mtime == stored_at
+
+    # ... so the size cap evicts the other entry first.
+    monkeypatch.setattr(response_cache, "CACHE_MAX_BYTES", 400)
+    store_response("third", "c" * 100, "resp_third")
+    assert old_path.exists()
+    assert not (tmp_path / "new.json").exists()
+
+    # Use does not extend the entry's lifetime past the TTL.
+    monkeypatch.setattr(response_cache, "CACHE_TTL_SECONDS", 30)
+    assert get_cached_response("old") is None
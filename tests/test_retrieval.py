@@ -0,0 +1,42 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+import retrieval
+from retrieval import get_document_index
+
+
+def _document(word: str) -> str:
+    return "\n".join(f"{word} paragraph {line} " + "x" * 80 for line in range(20))
+
+
+def _index_path(directory, text: str):
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return directory / f"{text_hash}-v{retrieval.INDEX_VERSION}.json"
+
+
+def test_document_indexes_are_evicted_by_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "INDEX_DIR", tmp_path)
+    monkeypatch.setattr(retrieval, "_document_cache", OrderedDict())
+    monkeypatch.setattr(retrieval, "_document_cache_bytes", 0)
+
+    first = get_document_index(_document("alpha"))
+    index_size = retrieval._document_cache_bytes
+    monkeypatch.setattr(retrieval, "MEMORY_MAX_BYTES", index_size * 2)
+    monkeypatch.setattr(retrieval, "INDEX_MAX_BYTES", index_size * 2)
+    get_document_index(_document("bravo"))
+    past = time.time() - 60
+    for path in tmp_path.glob("*.json"):
+        os.utime(path, (past, past))
+
+    # Using the first index makes the second one the least recently used one,
+    # in memory and on disk.
+    assert get_document_index(_document("alpha")) is first
+    get_document_index(_document("delta"))
+
+    assert len(retrieval._document_cache) == 2
+    assert retrieval._document_cache_bytes <= retrieval.MEMORY_MAX_BYTES
+    assert _index_path(tmp_path, _document("alpha")).exists()
+    assert not _index_path(tmp_path, _document("bravo")).exists()
+    assert _index_path(tmp_path, _document("delta")).exists()
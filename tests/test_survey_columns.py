@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import survey_columns
+from survey_columns import (
+    ARRAY_FILES,
+    SurveyColumns,
+    append_survey_rows,
+    load_survey_columns,
+    write_survey_columns,
+)
+
+
+def _columns(first_id, rows):
+    return SurveyColumns(
+        answers=np.full((rows, 3), 4, np.int8),
+        institution_ids=np.full(rows, 20, np.int32),
+        responder_ids=np.arange(first_id, first_id + rows, dtype=np.int32),
+        question_ids=["Pitanje_1", "Pitanje_2", "Pitanje_3"],
+        question_texts=["Prvo", "Drugo", "Treće"],
+    )
+
+
+def test_append_survey_rows(tmp_path):
+    write_survey_columns(tmp_path, _columns(1, 5))
+    append_survey_rows(tmp_path, _columns(6, 2))
+
+    columns = load_survey_columns(tmp_path)
+    assert columns.responder_ids.tolist() == list(range(1, 8))
+    assert columns.answers.shape == (7, 3)
+
+
+def test_interrupted_append_is_hidden_and_rolled_back(tmp_path, monkeypatch):
+    write_survey_columns(tmp_path, _columns(1, 5))
+    append_npy = survey_columns._append_npy
+    calls = []
+
+    def crash_on_second_file(path, rows):
+        calls.append(path)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        append_npy(path, rows)
+
+    monkeypatch.setattr(survey_columns, "_append_npy", crash_on_second_file)
+    with pytest.raises(KeyboardInterrupt):
+        append_survey_rows(tmp_path, _columns(6, 2))
+
+    assert load_survey_columns(tmp_path).responder_ids.tolist() == list(range(1, 6))
+
+    monkeypatch.setattr(survey_columns, "_append_npy", append_npy)
+    append_survey_rows(tmp_path, _columns(6, 2))
+
+    assert [np.load(tmp_path / name).shape[0] for name in ARRAY_FILES] == [7, 7, 7]
+    assert load_survey_columns(tmp_path).responder_ids.tolist() == list(range(1, 8))
@@ -0,0 +1,33 @@
+import pymupdf
+
+import upload_processing
+from upload_processing import SessionUploads, get_extraction, resolve_documents
+
+
+def _pdf_bytes(text):
+    document = pymupdf.open()
+    document.new_page().insert_text((72, 72), text)
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+def test_dropped_extraction_is_detected_and_restarted():
+    uploads = SessionUploads("test-session")
+    uploads.add("plan.pdf", _pdf_bytes("Strateski plan"))
+    assert not uploads.needs_extraction("plan.pdf")
+    assert uploads.needs_extraction("other.pdf")
+
+    (_, content_hash), = uploads.items()
+    with upload_processing._lock:
+        upload_processing._extractions.pop(content_hash)
+    assert get_extraction(content_hash) is None
+    assert uploads.needs_extraction("plan.pdf")
+    assert resolve_documents(uploads.items()) == []
+
+    uploads.remove("plan.pdf")
+    uploads.add("plan.pdf", _pdf_bytes("Strateski plan"))
+    (filename, text), = resolve_documents(uploads.items())
+    assert filename == "plan.pdf"
+    assert "Strateski plan" in text
+    uploads.remove("plan.pdf")
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pymupdf
+
+import utils
+from utils import extract_text_from_pdf, generate_conversation_pdf
+
+PAGES = 50
+
+
+def _write_pdf(path):
+    document = pymupdf.open()
+    for number in range(PAGES):
+        page = document.new_page()
+        page.insert_text((72, 72), f"Stranica {number}")
+    document.save(path)
+    document.close()
+
+
+def test_short_documents_skip_the_process_pool(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "long.pdf"
+    _write_pdf(pdf_path)
+
+    def no_pool(workers):
+        raise AssertionError("process pool used")
+
+    monkeypatch.setattr(utils, "_extract_pool", no_pool)
+    text = extract_text_from_pdf(pdf_path, workers=4)
+    assert text.index("Stranica 0") < text.index(f"Stranica {PAGES - 1}")
+
+
+def test_concurrent_parallel_extraction_from_threads(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "long.pdf"
+    _write_pdf(pdf_path)
+    # Force the pooled path, which PDFium only takes for very long documents.
+    monkeypatch.setattr(utils, "PARALLEL_MIN_PAGES", {"pdfium": 1})
+    results = []
+
+    def extract():
+        for _ in range(4):
+            results.append(extract_text_from_pdf(pdf_path, workers=2))
+
+    # Daemon threads, so a deadlocked extraction fails the test instead of hanging it.
+    threads = [threading.Thread(target=extract, daemon=True) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 120
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+
+    assert len(results) == 24
+    for text in results:
+        assert text.index("Stranica 0") < text.index(f"Stranica {PAGES - 1}")
+
+
+def test_conversation_pdf_is_one_continuous_section():
+    messages = [
+        {"role": "user", "content": "Pokreni analizu"},
+        {"role": "assistant", "content": "## Analiza\n\n- prva točka\n- druga točka"},
+        {"role": "user", "content": "Hvala"},
+        {"role": "assistant", "content": "| Skupina | Prosjek |\n|---|---|\n| studenti | 3.5 |"},
+    ]
+
+    document = pymupdf.open("pdf", generate_conversation_pdf(messages))
+    assert document.page_count == 1
+    assert [title for _, title, _ in document.get_toc()][1:] == [
+        "Poruka 1",
+        "Poruka 2",
+        "Analiza",
+        "Poruka 3",
+        "Poruka 4",
+    ]
+    document.close()
+
+
+def test_conversation_pdf_keeps_message_order():
+    messages = [
+        {
+            "role": "user" if number % 2 else "assistant",
+            "content": f"Sadržaj poruke {number}.\n\n" + "Odlomak teksta. " * 80,
+        }
+        for number in range(1, 13)
+    ]
+
+    document = pymupdf.open("pdf", generate_conversation_pdf(messages))
+    assert document.page_count > 1
+    text = "".join(page.get_text() for page in document)
+    document.close()
+
+    positions = [text.index(f"Sadržaj poruke {number}.") for number in range(1, 13)]
+    assert positions == sorted(positions)
+    assert text.index("Razgovor sa Savjetnikom") < positions[0]
@@ -0,0 +1,182 @@
+"""Background text extraction for user-uploaded PDF files.
+
+Uploads are hashed and handed to a small thread pool, so the page keeps
+rendering while large documents are parsed. Extractions are shared by
+content hash across files and sessions: re-uploading the same document under
+another name reuses the running or finished extraction. Callers block only
+when a prompt actually needs the text (``resolve_documents``).
+
+The text itself lives in ``document_store``. Each session tracks its uploads
+in a ``SessionUploads`` that holds one store reference per file and releases
+them when files are removed or the session is garbage collected.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from document_store import DOCUMENT_STORE
+from telemetry import span
+from utils import extract_text_from_pdf
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_EXTRACT_WORKERS = int(os.environ.get("UPLOAD_EXTRACT_WORKERS", "2"))
+
+
+class UploadExtraction:
+    """Progress and result of extracting one uploaded document."""
+
+    def __init__(self, content_hash: str):
+        self.content_hash = content_hash
+        self.pages_done = 0
+        self.pages_total = 0
+        self.future: Optional[Future] = None
+
+    def set_progress(self, pages_done: int, pages_total: int) -> None:
+        self.pages_done = pages_done
+        self.pages_total = pages_total
+
+    @property
+    def fraction(self) -> float:
+        return self.pages_done / self.pages_total if self.pages_total else 0.0
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def text(self) -> str:
+        """Return the extracted text, waiting for it if necessary."""
+        self.future.result()
+        return DOCUMENT_STORE.get(self.content_hash)
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=UPLOAD_EXTRACT_WORKERS, thread_name_prefix="upload-extract"
+)
+# content hash -> extraction
+_extractions: Dict[str, UploadExtraction] = {}
+_lock = threading.Lock()
+
+
+def _extract(
+    extraction: UploadExtraction, data: bytes, max_pages: Optional[int]
+) -> None:
+    with span("upload_extract", bytes=len(data)):
+        text = extract_text_from_pdf(
+            io.BytesIO(data), max_pages=max_pages, progress=extraction.set_progress
+        )
+    DOCUMENT_STORE.put(extraction.content_hash, text)
+    logger.info(
+        "Extracted upload %s: %d pages, %d characters",
+        extraction.content_hash[:12],
+        extraction.pages_done,
+        len(text),
+    )
+
+
+def submit_upload(data: bytes, owner: str, max_pages: Optional[int] = None) -> str:
+    """Reference ``data`` for ``owner`` and start extracting it unless it already is.
+
+    Returns the content hash; release it with ``release_upload``.
+    """
+    content_hash = hashlib.sha256(data).hexdigest()
+    with _lock:
+        DOCUMENT_STORE.acquire(content_hash, owner)
+        if content_hash in _extractions:
+            logger.debug("Reusing extraction of upload %s", content_hash[:12])
+            return content_hash
+        extraction = UploadExtraction(content_hash)
+        extraction.future = _executor.submit(_extract, extraction, data, max_pages)
+        _extractions[content_hash] = extraction
+    return content_hash
+
+
+def release_upload(content_hash: str, owner: str) -> None:
+    """Drop ``owner``'s reference, forgetting the extraction after the last one."""
+    with _lock:
+        if DOCUMENT_STORE.release(content_hash, owner):
+            _extractions.pop(content_hash, None)
+
+
+def _release_all(session_id: str, documents: Dict[str, str]) -> None:
+    for filename, content_hash in documents.items():
+        release_upload(content_hash, f"{session_id}/{filename}")
+    if documents:
+        logger.info(
+            "Released %d uploads of ended session %s", len(documents), session_id[:8]
+        )
+
+
+class SessionUploads:
+    """Filename -> content hash of one session's uploads.
+
+    Holds a store reference per file; they are released when a file is
+    removed and, for the rest, when the session state is garbage collected.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self._documents: Dict[str, str] = {}
+        weakref.finalize(self, _release_all, session_id, self._documents)
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._documents
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._documents))
+
+    def add(self, filename: str, data: bytes, max_pages: Optional[int] = None) -> None:
+        self._documents[filename] = submit_upload(
+            data, f"{self.session_id}/{filename}", max_pages
+        )
+
+    def remove(self, filename: str) -> None:
+        content_hash = self._documents.pop(filename)
+        release_upload(content_hash, f"{self.session_id}/{filename}")
+
+    def items(self) -> List[Tuple[str, str]]:
+        return list(self._documents.items())
+
+    def needs_extraction(self, filename: str) -> bool:
+        """Return True if ``filename`` is not tracked or its extraction is gone."""
+        content_hash = self._documents.get(filename)
+        return content_hash is None or get_extraction(content_hash) is None
+
+
+def get_extraction(content_hash: str) -> Optional[UploadExtraction]:
+    """Return the extraction started for ``content_hash``, if any."""
+    with _lock:
+        return _extractions.get(content_hash)
+
+
+def resolve_documents(
+    uploads: List[Tuple[str, str]],
+    set_status: Optional[Callable[[Optional[str]], None]] = None,
+) -> List[Tuple[str, str]]:
+    """Return ``(filename, text)`` for ``(filename, content_hash)`` uploads.
+
+    Waits for extractions still running. Documents that failed, contain no
+    readable text, or repeat an earlier upload's content are left out.
+    """
+    documents = []
+    seen = set()
+    for filename, content_hash in uploads:
+        extraction = get_extraction(content_hash)
+        if extraction is None or content_hash in seen:
+            continue
+        if not extraction.done() and set_status is not None:
+            set_status(f"Čitam učitani dokument {filename}...")
+        try:
+            text = extraction.text()
+        except Exception as exc:
+            logger.warning("Skipping unreadable upload %s: %s", filename, exc)
+            continue
+        if text.strip():
+            seen.add(content_hash)
+            documents.append((filename, text))
+    return documents
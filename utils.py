@@ -1,70 +1,174 @@
+import hashlib
+import io
 import json
-import tempfile
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from pathlib import Path
-from typing import BinaryIO, Union
+from typing import BinaryIO, Callable, Optional, Tuple, Union
 
-import pdfplumber
 from markdown_pdf import MarkdownPdf, Section
 
+from pdf_backends import PDF_TEXT_BACKEND, extract_pages, page_count
+from survey_columns import column_averages, is_columnar, load_survey_columns
+from survey_stats import stream_survey_stats
+from telemetry import span
+
 
 # Function to calculate averages and extract question texts
 def calculate_averages(json_path):
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    question_sums = {}
-    question_counts = {}
-    question_texts = {}
-
-    for responder in data:
-        for response in responder["Responses"]:
-            question_id = response["Question_ID"]
-            answer = response["Answer"]
-            if question_id not in question_sums:
-                question_sums[question_id] = 0
-                question_counts[question_id] = 0
-                question_texts[question_id] = response["Question_Text"]
-            question_sums[question_id] += answer
-            question_counts[question_id] += 1
-
-    averages = {}
-    for question_id in question_sums:
-        averages[question_id] = (
-            question_sums[question_id] / question_counts[question_id]
-        )
-
-    return {"averages": averages, "question_texts": question_texts}
+    """Return per-question averages for a columnar survey directory or JSON file."""
+    with span("survey_averages"):
+        if is_columnar(Path(json_path)):
+            return column_averages(load_survey_columns(Path(json_path)))
+
+        # JSON exports are streamed so memory does not grow with the respondent count.
+        stats = stream_survey_stats(Path(json_path))
+        return {"averages": stats["averages"], "question_texts": stats["question_texts"]}
+
+
+# Number of worker processes used for page-level extraction; 1 disables the pool.
+PDF_EXTRACT_WORKERS = int(
+    os.environ.get("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+# Per backend, documents shorter than this are extracted in-process. PDFium
+# reads a page in 2-3 ms, while each pooled call costs ~0.1 s to ship the
+# document and reopen it in the workers (plus ~0.5 s to spawn the pool once),
+# so it only pays off for very long documents; pdfplumber takes 150-200 ms
+# per page and gains from a few dozen pages on.
+PARALLEL_MIN_PAGES = {"pdfium": 400, "pdfplumber": 24}
+# Pages extracted between two progress reports on the in-process path.
+PROGRESS_BATCH_PAGES = 8
 
 
 # Function to extract text from PDF
-def extract_text_from_pdf(pdf_source: Union[str, Path, BinaryIO]):
-    """Return extracted text from a PDF path or binary stream."""
+def extract_text_from_pdf(
+    pdf_source: Union[str, Path, BinaryIO],
+    workers: Optional[int] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+    max_pages: Optional[int] = None,
+    backend: str = PDF_TEXT_BACKEND,
+    progress: Optional[Callable[[int, int], None]] = None,
+):
+    """Return extracted text from a PDF path or binary stream.
+
+    ``page_range`` selects pages with slice semantics (zero-based start,
+    exclusive stop) and ``max_pages`` caps how many of them are read. Long
+    documents are split into contiguous page ranges that are extracted
+    concurrently by ``workers`` processes and joined once, in page order.
+    ``backend`` names the engine from ``pdf_backends.BACKENDS``.
+    ``progress``, if given, is called with ``(pages_done, pages_total)`` as
+    extraction advances.
+    """
 
     if isinstance(pdf_source, (str, Path)):
-        open_target = pdf_source
+        open_target = str(pdf_source)
     else:
         pdf_source.seek(0)
-        open_target = pdf_source
-
-    with pdfplumber.open(open_target) as pdf:
-        text = ""
-        for page in pdf.pages:
-            text += (
-                page.extract_text() or ""
-            )  # Handle cases where extract_text() returns None
-    return text
-
-
-def convert_conversation_to_markdown(messages: list[dict]) -> str:
-    """Convert conversation messages to markdown format."""
-
-    if not messages:
-        return "# Razgovor\n\nNema poruka za izvoz."
-
-    # Header with timestamp
-    timestamp = datetime.now().strftime("%d.%m.%Y %H:%M")
-    markdown_content = f"""# Razgovor sa Savjetnikom za digitalnu transformaciju
+        open_target = pdf_source.read()
+
+    total_pages = page_count(open_target)
+
+    start, stop = page_range or (0, total_pages)
+    start, stop = max(start, 0), min(stop, total_pages)
+    if max_pages is not None:
+        stop = min(stop, start + max_pages)
+    if start >= stop:
+        return ""
+
+    with span("pdf_extract", pages=stop - start):
+        return _extract_page_range(open_target, start, stop, workers, backend, progress)
+
+
+def _extract_page_range(
+    open_target: Union[str, bytes],
+    start: int,
+    stop: int,
+    workers: Optional[int],
+    backend: str,
+    progress: Optional[Callable[[int, int], None]],
+) -> str:
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    workers = min(workers, stop - start)
+
+    if workers <= 1 or stop - start < PARALLEL_MIN_PAGES.get(backend, 0):
+        if progress is None:
+            return "".join(extract_pages(open_target, start, stop, backend))
+        page_texts = []
+        for batch_start in range(start, stop, PROGRESS_BATCH_PAGES):
+            batch_stop = min(batch_start + PROGRESS_BATCH_PAGES, stop)
+            page_texts.extend(
+                extract_pages(open_target, batch_start, batch_stop, backend)
+            )
+            progress(batch_stop - start, stop - start)
+        return "".join(page_texts)
+
+    chunk_size = -(-(stop - start) // workers)
+    bounds = [
+        (chunk_start, min(chunk_start + chunk_size, stop))
+        for chunk_start in range(start, stop, chunk_size)
+    ]
+
+    executor = _extract_pool(len(bounds))
+    try:
+        futures = [
+            executor.submit(
+                extract_pages, open_target, chunk_start, chunk_stop, backend
+            )
+            for chunk_start, chunk_stop in bounds
+        ]
+        if progress is not None:
+            pages_done = 0
+            for future in as_completed(futures):
+                pages_done += len(future.result())
+                progress(pages_done, stop - start)
+        page_texts = [text for future in futures for text in future.result()]
+    except BrokenProcessPool:
+        _discard_pool(executor)
+        raise
+
+    return "".join(page_texts)
+
+
+_extract_executor: Optional[ProcessPoolExecutor] = None
+_extract_executor_workers = 0
+_extract_executor_lock = threading.Lock()
+
+
+def _extract_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared extraction pool, created on first use.
+
+    Extraction runs on upload, job and batch threads; a forked child could
+    inherit a held _PDFIUM_LOCK and block forever, so workers are spawned.
+    The pool is replaced only when a call needs more workers than it has.
+    """
+    global _extract_executor, _extract_executor_workers
+    with _extract_executor_lock:
+        if _extract_executor is None or _extract_executor_workers < workers:
+            if _extract_executor is not None:
+                # Work already submitted by other threads still completes.
+                _extract_executor.shutdown(wait=False)
+            _extract_executor_workers = max(workers, PDF_EXTRACT_WORKERS)
+            _extract_executor = ProcessPoolExecutor(
+                max_workers=_extract_executor_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _extract_executor
+
+
+def _discard_pool(executor: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died, so the next call starts a new one."""
+    global _extract_executor
+    with _extract_executor_lock:
+        if _extract_executor is executor:
+            _extract_executor = None
+
+
+def _conversation_header_markdown(timestamp: str) -> str:
+    return f"""# Razgovor sa Savjetnikom za digitalnu transformaciju
 
 **Datum izvoza:** {timestamp}
 
@@ -72,21 +176,20 @@ def convert_conversation_to_markdown(messages: list[dict]) -> str:
 
 """
 
-    # Convert each message
-    for i, message in enumerate(messages, 1):
-        role = message.get("role", "")
-        content = message.get("content", "")
 
-        # Format role names
-        if role == "user":
-            role_name = "👤 **Korisnik**"
-        elif role == "assistant":
-            role_name = "**Savjetnik**"
-        else:
-            role_name = f"**{role.title()}**"
+def _message_markdown(number: int, message: dict) -> str:
+    role = message.get("role", "")
+    content = message.get("content", "")
+
+    # Format role names
+    if role == "user":
+        role_name = "👤 **Korisnik**"
+    elif role == "assistant":
+        role_name = "**Savjetnik**"
+    else:
+        role_name = f"**{role.title()}**"
 
-        # Add message to markdown
-        markdown_content += f"""## Poruka {i}
+    return f"""## Poruka {number}
 
 {role_name}
 
@@ -96,38 +199,40 @@ def convert_conversation_to_markdown(messages: list[dict]) -> str:
 
 """
 
-    return markdown_content
 
+def _conversation_sections(messages: list[dict]) -> list[str]:
+    if not messages:
+        return ["# Razgovor\n\nNema poruka za izvoz."]
 
-def generate_conversation_pdf(messages: list[dict]) -> bytes:
-    """Generate PDF from conversation messages."""
-    import os
+    timestamp = datetime.now().strftime("%d.%m.%Y %H:%M")
+    return [_conversation_header_markdown(timestamp)] + [
+        _message_markdown(number, message)
+        for number, message in enumerate(messages, 1)
+    ]
 
-    # Convert to markdown
-    markdown_content = convert_conversation_to_markdown(messages)
 
-    # Create PDF using markdown-pdf
-    pdf = MarkdownPdf(toc_level=2)
-    pdf.add_section(Section(markdown_content))
+def convert_conversation_to_markdown(messages: list[dict]) -> str:
+    """Convert conversation messages to markdown format."""
+    return "".join(_conversation_sections(messages))
 
-    # Generate PDF to temporary file and read bytes
-    tmp_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-    tmp_file_path = tmp_file.name
-    tmp_file.close()  # Close the file handle immediately
 
-    try:
-        # Save PDF to the temporary file path
-        pdf.save(tmp_file_path)
-
-        # Read the PDF file as bytes
-        with open(tmp_file_path, 'rb') as pdf_file:
-            pdf_bytes = pdf_file.read()
-
-        return pdf_bytes
-    finally:
-        # Clean up the temporary file
-        try:
-            os.unlink(tmp_file_path)
-        except (OSError, PermissionError):
-            # If we can't delete it immediately, it will be cleaned up later
-            pass
+def conversation_hash(messages: list[dict]) -> str:
+    """Return a digest identifying the content of a conversation."""
+    payload = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def generate_conversation_pdf(messages: list[dict]) -> bytes:
+    """Generate PDF from conversation messages.
+
+    The conversation is laid out as one continuous section, in memory.
+    """
+    with span("pdf_export", messages=len(messages)) as stage:
+        pdf = MarkdownPdf(toc_level=2)
+        pdf.add_section(Section(convert_conversation_to_markdown(messages)))
+
+        buffer = io.BytesIO()
+        pdf.save_bytes(buffer)
+        pdf_bytes = buffer.getvalue()
+        stage.set(bytes=len(pdf_bytes))
+    return pdf_bytes
@@ -1,46 +1,226 @@
 import argparse
+import glob
 import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
-parser = argparse.ArgumentParser(
-    description="Convert a digitalni upitnik XLSX into JSON"
+from institution_index import apply_delta, get_institution_index
+from survey_columns import (
+    MISSING_ANSWER,
+    SURVEY_DIR,
+    SurveyColumns,
+    append_survey_rows,
+    columns_to_records,
+    load_survey_columns,
+    write_survey_columns,
 )
-parser.add_argument("xlsx_path", help="relative path to the .xlsx file")
-args = parser.parse_args()
-
-input_path = Path(args.xlsx_path)
-df = pd.read_excel(input_path, header=0)
-
-split_row = df[df["VU_ID"] == "ID pitanja"].index[0]
-
-answers_frame = df.iloc[:split_row].dropna(subset=["VU_ID"]).copy()
-answers_frame["VU_ID"] = answers_frame["VU_ID"].astype(int)
-answers_frame["Respondent_ID"] = answers_frame["Respondent_ID"].astype(int)
-
-questions_frame = df.iloc[split_row + 1 :, :2].copy()
-questions_frame.columns = ["Question_ID", "Question_Text"]
-question_mapping = questions_frame.set_index("Question_ID")["Question_Text"].to_dict()
-
-output_records = []
-for _, row in answers_frame.iterrows():
-    record = {
-        "Institution_ID": row["VU_ID"],
-        "Responder_ID": row["Respondent_ID"],
-        "Responses": [],
-    }
-    for question_id, question_text in question_mapping.items():
-        if question_id in row:
-            record["Responses"].append(
-                {
-                    "Question_ID": question_id,
-                    "Question_Text": question_text,
-                    "Answer": int(row[question_id]),
-                }
-            )
-    output_records.append(record)
-
-output_path = input_path.with_suffix(".json")
-with open(output_path, "w", encoding="utf-8") as f:
-    json.dump(output_records, f, ensure_ascii=False, indent=2)
+from telemetry import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def read_workbook(input_path: Path) -> SurveyColumns:
+    """Parse one digitalni upitnik workbook into columnar survey data."""
+    df = pd.read_excel(input_path, header=0)
+
+    split_row = df[df["VU_ID"] == "ID pitanja"].index[0]
+
+    answers_frame = df.iloc[:split_row].dropna(subset=["VU_ID"])
+
+    questions_frame = df.iloc[split_row + 1 :, :2].copy()
+    questions_frame.columns = ["Question_ID", "Question_Text"]
+    questions_frame = questions_frame[
+        questions_frame["Question_ID"].isin(answers_frame.columns)
+    ]
+
+    question_ids = questions_frame["Question_ID"].tolist()
+    answers = (
+        answers_frame[question_ids]
+        .apply(pd.to_numeric, errors="coerce")
+        .fillna(MISSING_ANSWER)
+        .to_numpy(dtype=np.int8)
+    )
+
+    return SurveyColumns(
+        answers=answers,
+        institution_ids=answers_frame["VU_ID"].astype(int).to_numpy(),
+        responder_ids=answers_frame["Respondent_ID"].astype(int).to_numpy(),
+        question_ids=question_ids,
+        question_texts=questions_frame["Question_Text"].tolist(),
+    )
+
+
+def convert_workbook(input_path: Path, output_dir: Path, write_json: bool) -> int:
+    """Write columnar data and optional JSON records; return the respondent count."""
+    category = input_path.stem
+    columns = read_workbook(input_path)
+    write_survey_columns(output_dir / category, columns)
+
+    if write_json:
+        output_path = input_path.with_suffix(".json")
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(columns_to_records(columns), f, ensure_ascii=False, indent=2)
+
+    return len(columns.responder_ids)
+
+
+def read_delta(input_path: Path, question_ids: list[str]) -> SurveyColumns:
+    """Read new respondent rows from an XLSX or CSV file in ``question_ids`` order.
+
+    The file holds the answer block of a survey workbook (``VU_ID``,
+    ``Respondent_ID`` and one column per question); an XLSX may also carry the
+    trailing question table of a full workbook.
+    """
+    if input_path.suffix.lower() == ".csv":
+        frame = pd.read_csv(input_path)
+    else:
+        frame = pd.read_excel(input_path, header=0)
+        question_rows = frame.index[frame["VU_ID"] == "ID pitanja"]
+        if len(question_rows):
+            frame = frame.iloc[: question_rows[0]]
+    frame = frame.dropna(subset=["VU_ID"])
+
+    unknown = [
+        column
+        for column in frame.columns
+        if column not in ("VU_ID", "Respondent_ID") and column not in question_ids
+    ]
+    if unknown:
+        raise ValueError(f"{input_path} has unknown questions: {', '.join(unknown)}")
+
+    answers = (
+        frame.reindex(columns=question_ids)
+        .apply(pd.to_numeric, errors="coerce")
+        .fillna(MISSING_ANSWER)
+        .to_numpy(dtype=np.int8)
+    )
+    return SurveyColumns(
+        answers=answers,
+        institution_ids=frame["VU_ID"].astype(int).to_numpy(),
+        responder_ids=frame["Respondent_ID"].astype(int).to_numpy(),
+        question_ids=question_ids,
+        question_texts=[],
+    )
+
+
+def append_responses(category: str, input_path: Path) -> int:
+    """Append new, not yet seen respondents and update aggregates incrementally.
+
+    Respondents are identified by ``(Institution_ID, Responder_ID)``; rows
+    already stored, or repeated within the delta, are skipped. Returns the
+    number of respondents added.
+    """
+    survey_path = SURVEY_DIR / category
+    # Make sure the index reflects the sources before they change underneath it.
+    get_institution_index()
+
+    existing = load_survey_columns(survey_path)
+    delta = read_delta(input_path, existing.question_ids)
+
+    seen = set(zip(existing.institution_ids.tolist(), existing.responder_ids.tolist()))
+    keep = []
+    for row, key in enumerate(
+        zip(delta.institution_ids.tolist(), delta.responder_ids.tolist())
+    ):
+        if key not in seen:
+            seen.add(key)
+            keep.append(row)
+
+    skipped = len(delta.responder_ids) - len(keep)
+    if skipped:
+        logger.info("%s: skipped %s already stored respondents", input_path, skipped)
+    if not keep:
+        return 0
+
+    delta = SurveyColumns(
+        answers=delta.answers[keep],
+        institution_ids=delta.institution_ids[keep],
+        responder_ids=delta.responder_ids[keep],
+        question_ids=existing.question_ids,
+        question_texts=existing.question_texts,
+    )
+    append_survey_rows(survey_path, delta)
+    apply_delta(category, delta)
+    return len(keep)
+
+
+def resolve_inputs(patterns: list[str]) -> list[Path]:
+    """Expand directories and glob patterns into a sorted list of workbooks."""
+    paths: set[Path] = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.update(path.glob("*.xlsx"))
+        elif glob.has_magic(pattern):
+            paths.update(Path(match) for match in glob.glob(pattern))
+        else:
+            paths.add(path)
+    # Skip Excel lock files such as "~$studenti.xlsx" left by open workbooks.
+    return sorted(path for path in paths if not path.name.startswith("~$"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert digitalni upitnik XLSX workbooks into columnar survey data"
+    )
+    parser.add_argument(
+        "xlsx_paths",
+        nargs="+",
+        help="workbook paths, directories (e.g. anketa/) or glob patterns",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="also write per-respondent JSON records next to each workbook",
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="treat inputs as new respondent rows (XLSX or CSV) for an existing group",
+    )
+    parser.add_argument(
+        "--category",
+        default=None,
+        help="survey group the --append rows belong to (default: file name stem)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of workbooks processed in parallel (default: CPU count)",
+    )
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.append:
+        for path in args.xlsx_paths:
+            category = args.category or Path(path).stem
+            added = append_responses(category, Path(path))
+            print(f"{path}: appended {added} respondents to {category}")
+        return
+
+    input_paths = resolve_inputs(args.xlsx_paths)
+    if not input_paths:
+        parser.error("no .xlsx workbooks found")
+
+    # Workbooks always land in SURVEY_DIR: the institution index and the
+    # app only read from there.
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(convert_workbook, path, SURVEY_DIR, args.json)
+            for path in input_paths
+        ]
+        for path, future in zip(input_paths, futures):
+            print(f"{path}: {future.result()} respondents")
+
+    # Rebuilds the per-institution index, the single store of survey
+    # averages, if any survey source changed.
+    get_institution_index()
+
+
+if __name__ == "__main__":
+    main()